@@ -0,0 +1,149 @@
+"""Splitting instances into independent clusters and caching their solutions.
+
+A cluster is a group of polylines whose ranges of X coordinates overlap.
+Clusters of the same shape are often repeated, shifted along the X axis, so
+solutions are cached for canonical clusters: clusters moved to X = 0 with
+their polylines sorted by geometry rather than names.
+
+For each cluster, three solutions are needed because the cutter may either
+pass through it to the clusters on the right, end in it, or come back to it
+from the clusters on the right and then return further to the left.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from cut_optimizer.instance import Point, Polyline
+
+# Polylines of a canonical cluster without names.
+CanonicalKey = Tuple[Tuple[bool, Point, Point], ...]
+
+# A step of a solution of a canonical cluster: index of a polyline in the
+# cluster and points where the cut starts and ends.
+CanonicalStep = Tuple[int, Point, Point]
+
+
+def split_into_clusters(polylines: Sequence[Polyline]) -> List[List[Polyline]]:
+    """Split polylines into clusters with disjoint ranges of X coordinates.
+
+    Polylines which touch at some X coordinate belong to the same cluster.
+
+    :return: clusters sorted by their X coordinates.
+    """
+    clusters: List[List[Polyline]] = []
+    cluster_end = 0
+    for polyline in sorted(polylines, key=_min_x):
+        if clusters and _min_x(polyline) <= cluster_end:
+            clusters[-1].append(polyline)
+            cluster_end = max(cluster_end, _max_x(polyline))
+        else:
+            clusters.append([polyline])
+            cluster_end = _max_x(polyline)
+    return clusters
+
+
+def is_single_cluster(polylines: Sequence[Polyline]) -> bool:
+    """Tell if polylines form at most one cluster.
+
+    This is cheaper than `split_into_clusters` since it builds no clusters
+    and stops at the first gap.
+    """
+    cluster_end: Optional[int] = None
+    for polyline in sorted(polylines, key=_min_x):
+        if cluster_end is not None and _min_x(polyline) > cluster_end:
+            return False
+        cluster_end = max(_max_x(polyline), cluster_end or 0)
+    return True
+
+
+class CanonicalCluster:
+    """Cluster of polylines together with its canonical form."""
+
+    def __init__(self, polylines: Sequence[Polyline]) -> None:
+        assert polylines
+        self.shift = min(_min_x(polyline) for polyline in polylines)
+        self.polylines = sorted(polylines, key=self._canonical_geometry)
+        self.key: CanonicalKey = tuple(
+            self._canonical_geometry(polyline) for polyline in self.polylines
+        )
+
+    def canonical_polylines(self) -> List[Polyline]:
+        """Return polylines of the canonical cluster.
+
+        Polylines are named after their indices in the cluster.
+        """
+        return [
+            Polyline(str(index), start, end, is_closed)
+            for index, (is_closed, start, end) in enumerate(self.key)
+        ]
+
+    def restore(
+        self, steps: Sequence[CanonicalStep]
+    ) -> List[Tuple[Polyline, Point, Point]]:
+        """Map steps of a canonical solution back to this cluster."""
+        return [
+            (
+                self.polylines[index],
+                start._replace(x=start.x + self.shift),
+                end._replace(x=end.x + self.shift),
+            )
+            for index, start, end in steps
+        ]
+
+    def _canonical_geometry(
+        self, polyline: Polyline
+    ) -> Tuple[bool, Point, Point]:
+        return (
+            polyline.is_closed,
+            polyline.start._replace(x=polyline.start.x - self.shift),
+            polyline.end._replace(x=polyline.end.x - self.shift),
+        )
+
+
+class ClusterSolution(NamedTuple):
+    """Solution of a canonical cluster for one way of visiting it."""
+
+    steps: List[CanonicalStep]
+    # Penalty of the solution, including the final move to the right end of
+    # the cluster if the cutter leaves it to the right.
+    penalty: int
+    # Index of the step before which the cutter is at the right end of the
+    # cluster for the first time. Other clusters may be visited from there.
+    split: int
+
+
+class ClusterSolutions(NamedTuple):
+    """Solutions of a canonical cluster for all ways of visiting it.
+
+    The cutter always enters a cluster at X = 0.
+    """
+
+    # X coordinate of the rightmost point visited in the cluster.
+    right_x: int
+    # Solution when the cutter leaves the cluster to the right.
+    passing: ClusterSolution
+    # Solution when the cutter ends in this cluster.
+    ending: ClusterSolution
+    # Solution when the cutter goes back to the left after this cluster.
+    returning: ClusterSolution
+
+
+class SolutionCache:
+    """Solutions of canonical clusters which can be shared between solves.
+
+    A cached solution keeps the ties broken when it was found, so solves
+    which share a cache depend on the order in which they're run.
+    """
+
+    def __init__(self) -> None:
+        self.solutions: Dict[CanonicalKey, ClusterSolutions] = {}
+
+    def __len__(self) -> int:
+        return len(self.solutions)
+
+
+def _min_x(polyline: Polyline) -> int:
+    return min(polyline.start.x, polyline.end.x)
+
+
+def _max_x(polyline: Polyline) -> int:
+    return max(polyline.start.x, polyline.end.x)
@@ -0,0 +1,457 @@
+"""Approximate solving with X coordinates snapped into buckets.
+
+X coordinates are rounded down to multiples of a bucket width, which makes
+the graph much smaller when there are many distinct coordinates. The order
+of cutting found for the coarse instance is then applied to the original
+polylines, and the order of steps within buckets, cut positions and
+directions are refined locally.
+
+Closed polylines are cut at the same positions as `XCoordGraph` would
+choose for the original instance, snapped into their buckets. Snapping
+moves each position by less than the bucket width and every position takes
+part in at most two idle moves, so mapping a solution between the original
+and the coarse instance changes its X travel by at most the total snapping
+error. Mapping the exact solution to the coarse instance and the coarse
+solution back gives an upper bound on the extra X travel of twice that
+error.
+"""
+
+import bisect
+import math
+import random
+from typing import Dict, List, Optional, Tuple
+
+from cut_optimizer.algorithms.optimize_x_moves import (
+    find_fast_path,
+    open_x_coords,
+    optimize_x_moves,
+    place_closed_polylines,
+    SolutionStep,
+    SolverStats,
+)
+from cut_optimizer.instance import Point, Polyline
+
+# Passes over all buckets when reversing segments. Later passes find few
+# improvements, so more of them aren't worth their time.
+REVERSE_PASSES = 5
+
+
+def snap(x_coord: int, bucket_width: int) -> int:
+    """Return the beginning of the bucket of an X coordinate."""
+    return x_coord - x_coord % bucket_width
+
+
+def closed_positions(polylines: List[Polyline]) -> List[Optional[int]]:
+    """Return X coordinates where `XCoordGraph` cuts closed polylines.
+
+    :return: positions of closed polylines and `None` for open ones.
+    """
+    closed = (poly for poly in polylines if poly.is_closed)
+    # Equal polylines are interchangeable, so their positions can be
+    # assigned in any order.
+    positions: Dict[Polyline, List[int]] = {}
+    for polyline, position in place_closed_polylines(
+        open_x_coords(polylines), closed
+    ):
+        positions.setdefault(polyline, []).append(position)
+    return [
+        positions[polyline].pop() if polyline.is_closed else None
+        for polyline in polylines
+    ]
+
+
+def refine_solution(
+    steps: List[SolutionStep], bucket_width: int = 1
+) -> List[SolutionStep]:
+    """Improve the order, cut positions and directions of steps locally.
+
+    Steps of a run which stays within one bucket can be cut in any order
+    without changing the coarse X travel, so each run is swept from left to
+    right or from right to left. Steps between two idle moves within the
+    same bucket can also be cut in reverse, which pairs the ends of the
+    moves differently. Then cut positions and directions of single steps are
+    changed. Each change is made only if it doesn't make the X travel
+    longer.
+    """
+    refined = _reverse_segments(
+        _sweep_buckets(steps, bucket_width), bucket_width
+    )
+    for index, step in enumerate(refined):
+        polyline = step.polyline
+        prev_x = refined[index - 1].end.x if index > 0 else 0
+        next_x: Optional[int] = None
+        if index + 1 < len(refined):
+            next_x = refined[index + 1].start.x
+        if polyline.is_closed:
+            # Any point between `prev_x` and `next_x` is optimal, otherwise
+            # the closest one.
+            target_x = prev_x if next_x is None else min(prev_x, next_x)
+            x = min(max(polyline.start.x, target_x), polyline.end.x)
+            start = Point(x, polyline.start.y)
+            refined[index] = SolutionStep(polyline, start, start)
+            continue
+        forward_travel = _idle_travel(prev_x, step.start, step.end, next_x)
+        reverse_travel = _idle_travel(prev_x, step.end, step.start, next_x)
+        if reverse_travel < forward_travel:
+            refined[index] = SolutionStep(polyline, step.end, step.start)
+    return refined
+
+
+def _sweep_buckets(
+    steps: List[SolutionStep], bucket_width: int
+) -> List[SolutionStep]:
+    """Reorder runs of steps within one bucket if it makes X travel shorter."""
+    swept: List[SolutionStep] = []
+    index = 0
+    while index < len(steps):
+        bucket = _bucket(steps[index], bucket_width)
+        run_end = index + 1
+        while (
+            bucket is not None
+            and run_end < len(steps)
+            and _bucket(steps[run_end], bucket_width) == bucket
+        ):
+            run_end += 1
+        run = steps[index:run_end]
+        if len(run) > 1:
+            prev_x = swept[-1].end.x if swept else 0
+            next_x: Optional[int] = None
+            if run_end < len(steps):
+                next_x = steps[run_end].start.x
+            # The original order comes first, so it's kept on ties.
+            run = min(
+                [run, _sweep(run, reverse=False), _sweep(run, reverse=True)],
+                key=lambda candidate: _run_travel(prev_x, candidate, next_x),
+            )
+        swept.extend(run)
+        index = run_end
+    return swept
+
+
+def _bucket(step: SolutionStep, bucket_width: int) -> Optional[int]:
+    """Return the bucket of a step or `None` if it spans several buckets."""
+    bucket = snap(step.start.x, bucket_width)
+    if snap(step.end.x, bucket_width) != bucket:
+        return None
+    return bucket
+
+
+def _sweep(steps: List[SolutionStep], reverse: bool) -> List[SolutionStep]:
+    """Order steps by X and cut each of them in the direction of the sweep."""
+    oriented = []
+    for step in steps:
+        if (step.start.x > step.end.x) != reverse:
+            step = SolutionStep(step.polyline, step.end, step.start)
+        oriented.append(step)
+    return sorted(oriented, key=lambda step: step.start.x, reverse=reverse)
+
+
+def _run_travel(
+    prev_x: int, steps: List[SolutionStep], next_x: Optional[int]
+) -> int:
+    """Return the X travel of idle moves to, between and from steps."""
+    travel = 0
+    for step in steps:
+        travel += abs(step.start.x - prev_x)
+        prev_x = step.end.x
+    if next_x is not None:
+        travel += abs(next_x - prev_x)
+    return travel
+
+
+def _reverse_segments(
+    steps: List[SolutionStep], bucket_width: int
+) -> List[SolutionStep]:
+    """Reverse segments of steps while it makes X travel shorter.
+
+    Only segments between two idle moves which stay within the same bucket
+    are tried, in at most `REVERSE_PASSES` passes over all buckets. A pass
+    takes O(n + sum of k^2 + r * sqrt(n)) time for buckets with k moves and
+    r reversed segments.
+    """
+    tour = _Tour(steps)
+    for _ in range(REVERSE_PASSES):
+        tour.follow()
+        moves_by_bucket = tour.moves_by_bucket(bucket_width)
+        improved = False
+        for bucket in list(moves_by_bucket):
+            if len(moves_by_bucket[bucket]) < 2:
+                continue
+            if len(tour.pieces) > tour.max_pieces:
+                tour.follow()
+                moves_by_bucket = tour.moves_by_bucket(bucket_width)
+            if tour.reverse_between(moves_by_bucket[bucket]):
+                improved = True
+        if not improved:
+            break
+    return tour.solution()
+
+
+class _Tour:
+    """Steps of a solution kept as links between their ends.
+
+    Ends of steps are numbered 2 * index for starts and 2 * index + 1 for
+    ends, followed by the origin and the free end of the last idle move.
+    Idle moves link two ends, so reversing the steps between two moves only
+    relinks them. Moves are numbered by the index of the step which follows
+    them.
+
+    Numbers of moves are known from the order in which links were last
+    followed, and from pieces of that order as they go now. Each reversed
+    segment splits at most two pieces, and links are followed again when
+    there are more than `max_pieces` of them.
+    """
+
+    def __init__(self, steps: List[SolutionStep]) -> None:
+        self.steps = steps
+        self.points = [
+            point for step in steps for point in (step.start, step.end)
+        ]
+        self.x_coords = [point.x for point in self.points] + [0, 0]
+        self.origin = len(self.points)
+        self.free_end = self.origin + 1
+        self.links = list(range(len(self.x_coords)))
+        start = self.origin
+        for index in range(len(steps)):
+            self._link(start, 2 * index)
+            start = 2 * index + 1
+        self._link(start, self.free_end)
+        self.max_pieces = int(math.sqrt(len(steps))) + 1
+        self.follow()
+
+    def _link(self, end: int, other_end: int) -> None:
+        """Join two ends of steps with an idle move."""
+        self.links[end] = other_end
+        self.links[other_end] = end
+
+    def follow(self) -> None:
+        """Follow links from the origin and number idle moves in order."""
+        # Ends where each move starts and ends, and the number of the move
+        # at each end.
+        self.moves: List[Tuple[int, int]] = []
+        self.numbers = [0] * len(self.links)
+        start = self.origin
+        while True:
+            end = self.links[start]
+            self.numbers[start] = self.numbers[end] = len(self.moves)
+            self.moves.append((start, end))
+            if end == self.free_end:
+                break
+            # The other end of the same step.
+            start = end ^ 1
+        # The first and last followed move of each piece, in the order in
+        # which pieces go now, and whether the piece is reversed.
+        self.pieces = [(0, len(self.moves) - 1, False)]
+        self._offsets: Optional[Tuple[List[int], List[int], List[int]]] = None
+
+    def moves_by_bucket(self, bucket_width: int) -> Dict[int, List[int]]:
+        """Return followed moves which stay within each bucket.
+
+        Reversing segments only relinks moves within one bucket, so each
+        bucket keeps its moves until links are followed again. The last move
+        may end anywhere, so it's in the bucket where it starts.
+        """
+        moves_by_bucket: Dict[int, List[int]] = {}
+        for move, (start, end) in enumerate(self.moves):
+            bucket = snap(self.x_coords[start], bucket_width)
+            if (
+                end == self.free_end
+                or snap(self.x_coords[end], bucket_width) == bucket
+            ):
+                moves_by_bucket.setdefault(bucket, []).append(move)
+        return moves_by_bucket
+
+    def solution(self) -> List[SolutionStep]:
+        """Return steps in the order given by the links."""
+        self.follow()
+        return [
+            SolutionStep(
+                self.steps[end // 2].polyline,
+                self.points[end],
+                self.points[end ^ 1],
+            )
+            for _, end in self.moves[:-1]
+        ]
+
+    def reverse_between(self, followed: List[int]) -> bool:
+        """Reverse segments of steps between pairs of given idle moves.
+
+        A segment is reversed if it makes X travel shorter.
+
+        :param followed: numbers of moves in the order of the last follow.
+        :return: whether any segment was reversed.
+        """
+        moves, starts, ends = self._current_moves(followed)
+        x_coords = self.x_coords
+        reversed_any = False
+        for index in range(len(moves)):
+            for other in range(index + 1, len(moves)):
+                start_x = x_coords[starts[index]]
+                old_travel = abs(x_coords[ends[index]] - start_x)
+                new_travel = abs(x_coords[starts[other]] - start_x)
+                if ends[other] != self.free_end:
+                    end_x = x_coords[ends[other]]
+                    old_travel += abs(end_x - x_coords[starts[other]])
+                    new_travel += abs(end_x - x_coords[ends[index]])
+                if new_travel >= old_travel:
+                    continue
+                self._link(starts[index], starts[other])
+                self._link(ends[index], ends[other])
+                first = moves[index]
+                last = moves[other]
+                self._reverse_pieces(first + 1, last)
+                reversed_any = True
+                # Moves within the segment go in the opposite direction.
+                inner = slice(index + 1, other)
+                moves[inner] = [
+                    first + last - move for move in reversed(moves[inner])
+                ]
+                inner_starts = starts[inner]
+                starts[inner] = ends[inner][::-1]
+                ends[inner] = inner_starts[::-1]
+                ends[index], starts[other] = starts[other], ends[index]
+        return reversed_any
+
+    def _current_moves(
+        self, followed: List[int]
+    ) -> Tuple[List[int], List[int], List[int]]:
+        """Return numbers, starts and ends of followed moves as they go now.
+
+        :return: moves sorted by their current numbers.
+        """
+        if self._offsets is None:
+            offsets = []
+            offset = 0
+            for first, last, _ in self.pieces:
+                offsets.append(offset)
+                offset += last - first + 1
+            order = sorted(
+                range(len(self.pieces)), key=lambda piece: self.pieces[piece]
+            )
+            firsts = [self.pieces[piece][0] for piece in order]
+            self._offsets = (order, firsts, offsets)
+        order, firsts, offsets = self._offsets
+        current = []
+        for move in followed:
+            piece = order[bisect.bisect_right(firsts, move) - 1]
+            first, last, is_reversed = self.pieces[piece]
+            start, end = self.moves[move]
+            if is_reversed:
+                number = offsets[piece] + last - move
+                start, end = end, start
+            else:
+                number = offsets[piece] + move - first
+            current.append((number, start, end))
+        current.sort()
+        return (
+            [number for number, _, _ in current],
+            [start for _, start, _ in current],
+            [end for _, _, end in current],
+        )
+
+    def _reverse_pieces(self, begin: int, end: int) -> None:
+        """Reverse the order of moves with current numbers in a range."""
+        begin_piece = self._split(begin)
+        end_piece = self._split(end)
+        self.pieces[begin_piece:end_piece] = [
+            (first, last, not is_reversed)
+            for first, last, is_reversed in reversed(
+                self.pieces[begin_piece:end_piece]
+            )
+        ]
+        self._offsets = None
+
+    def _split(self, number: int) -> int:
+        """Split pieces so that one begins with the current move number.
+
+        :return: index of the piece which begins with the move.
+        """
+        offset = 0
+        for index, (first, last, is_reversed) in enumerate(self.pieces):
+            if number == offset:
+                return index
+            length = last - first + 1
+            if number < offset + length:
+                cut = number - offset
+                if is_reversed:
+                    split = [
+                        (last - cut + 1, last, True),
+                        (first, last - cut, True),
+                    ]
+                else:
+                    split = [
+                        (first, first + cut - 1, False),
+                        (first + cut, last, False),
+                    ]
+                self.pieces[index : index + 1] = split
+                return index + 1
+            offset += length
+        return len(self.pieces)
+
+
+def _idle_travel(
+    prev_x: int, start: Point, end: Point, next_x: Optional[int]
+) -> int:
+    """Return the X travel of idle moves to and from a step."""
+    travel = abs(start.x - prev_x)
+    if next_x is not None:
+        travel += abs(next_x - end.x)
+    return travel
+
+
+def optimize_x_moves_coarse(
+    polylines: List[Polyline],
+    bucket_width: int,
+    stats: Optional[SolverStats] = None,
+    rng: Optional[random.Random] = None,
+) -> List[SolutionStep]:
+    """Find an order of cutting with X travel close to the minimal one.
+
+    If `stats` are given, `extra_travel_bound` is set to an upper bound on
+    how much longer the X travel is than that of `optimize_x_moves`.
+    """
+    assert bucket_width > 0
+    if find_fast_path(polylines) is not None:
+        # Such instances are solved exactly without building a graph.
+        return optimize_x_moves(polylines, stats, rng=rng)
+    positions = closed_positions(polylines)
+    # Coarse polylines are named after indices of the original ones, and
+    # closed polylines are narrowed down to their positions.
+    coarse = []
+    snapping_error = 0
+    for index, (polyline, position) in enumerate(zip(polylines, positions)):
+        if position is None:
+            start_x = snap(polyline.start.x, bucket_width)
+            end_x = snap(polyline.end.x, bucket_width)
+            snapping_error += polyline.start.x - start_x
+            snapping_error += polyline.end.x - end_x
+        else:
+            start_x = end_x = snap(position, bucket_width)
+            snapping_error += 2 * (position - start_x)
+        coarse.append(
+            Polyline(
+                str(index),
+                polyline.start._replace(x=start_x),
+                polyline.end._replace(x=end_x),
+                polyline.is_closed,
+            )
+        )
+
+    steps = []
+    for coarse_step in optimize_x_moves(coarse, stats, rng=rng):
+        index = int(coarse_step.polyline.name)
+        polyline = polylines[index]
+        position = positions[index]
+        if position is not None:
+            start = Point(position, polyline.start.y)
+            steps.append(SolutionStep(polyline, start, start))
+        elif coarse_step.start == coarse_step.polyline.start:
+            steps.append(SolutionStep(polyline, polyline.start, polyline.end))
+        else:
+            steps.append(SolutionStep(polyline, polyline.end, polyline.start))
+    if stats is not None:
+        stats.extra_travel_bound = 2 * snapping_error
+    if snapping_error == 0:
+        # Nothing was snapped, so the solution is already optimal.
+        return steps
+    return refine_solution(steps, bucket_width)
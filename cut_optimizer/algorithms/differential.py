@@ -0,0 +1,457 @@
+"""Differential testing and benchmarking of solver engines.
+
+Every registered engine is run on the same instances as the reference
+solver, which is the original solver kept unchanged in `reference.py`. It
+isn't an engine, so it can't be selected by users. The X travel of their
+solutions must be the same and each solution must cut every polyline exactly
+once. Times of both are recorded and reported as speedups.
+
+The approximate coarse mode is compared with an exact engine instead, and
+its X travel may exceed the exact one only by the bound it reports.
+
+Usage:
+
+    python -m cut_optimizer.algorithms.differential [--check-baseline]
+
+Wall-clock speedups vary between runs and machines, so comparing them with
+a stored baseline, by default `differential_baseline.json` next to this
+file, is opt-in. The stored baseline was measured with
+
+    python -m cut_optimizer.algorithms.differential --bucket-width 5 \
+        --bucket-width 20 --update-baseline
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from cut_optimizer.algorithms import reference
+from cut_optimizer.algorithms.coarse import optimize_x_moves_coarse
+from cut_optimizer.algorithms.engines import Engine, ENGINES
+from cut_optimizer.algorithms.optimize_x_moves import SolutionStep, SolverStats
+from cut_optimizer.instance import Point, Polyline
+from cut_optimizer.profiling import profile
+
+# Engine whose solutions approximate ones are compared with.
+EXACT_ENGINE = "fast"
+
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(__file__), "differential_baseline.json"
+)
+
+
+class InvalidSolution(Exception):
+    """Raised when a solution doesn't cut all polylines in a valid way."""
+
+
+class EngineMismatch(Exception):
+    """Raised when an engine finds a different X travel than the reference."""
+
+
+class PerformanceRegression(Exception):
+    """Raised when an engine is slower than its stored baseline."""
+
+
+class BoundExceeded(Exception):
+    """Raised when an approximate solution is worse than its reported bound."""
+
+
+@dataclass
+class ComparisonResult:
+    """Result of running an engine and the reference on one instance."""
+
+    engine: str
+    instance: str
+    x_travel: int
+    reference_seconds: float
+    engine_seconds: float
+
+    @property
+    def speedup(self) -> float:
+        """How many times the engine is faster than the reference."""
+        return self.reference_seconds / max(self.engine_seconds, 1e-9)
+
+
+def x_travel(steps: Sequence[SolutionStep]) -> int:
+    """Return the total X distance of idle moves between steps.
+
+    The cutting head starts at X = 0.
+    """
+    travel = 0
+    current_x = 0
+    for step in steps:
+        travel += abs(step.start.x - current_x)
+        current_x = step.end.x
+    return travel
+
+
+def check_solution(
+    polylines: Sequence[Polyline], steps: Sequence[SolutionStep]
+) -> None:
+    """Check that steps cut every polyline exactly once in a valid way.
+
+    :raises InvalidSolution: if the solution isn't valid.
+    """
+    if Counter(step.polyline for step in steps) != Counter(polylines):
+        raise InvalidSolution("Polylines are not cut exactly once")
+    for step in steps:
+        polyline = step.polyline
+        if polyline.is_closed:
+            valid = (
+                step.start == step.end
+                and polyline.start.x <= step.start.x <= polyline.end.x
+                and step.start.y == polyline.start.y
+            )
+        else:
+            valid = (step.start, step.end) in {
+                (polyline.start, polyline.end),
+                (polyline.end, polyline.start),
+            }
+        if not valid:
+            raise InvalidSolution(f"Invalid step: {step}")
+
+
+def random_instance(
+    rng: random.Random,
+    size: int,
+    max_x: int = 100,
+    closed_fraction: float = 0.3,
+) -> List[Polyline]:
+    """Create a random instance with a given number of polylines."""
+
+    def random_point() -> Point:
+        return Point(rng.randint(0, max_x), rng.randint(0, max_x))
+
+    polylines = []
+    for index in range(size):
+        point_1 = random_point()
+        point_2 = random_point()
+        if rng.random() < closed_fraction:
+            start = Point(min(point_1.x, point_2.x), min(point_1.y, point_2.y))
+            end = Point(max(point_1.x, point_2.x), max(point_1.y, point_2.y))
+            polylines.append(Polyline(f"C{index}", start, end, True))
+        else:
+            polylines.append(Polyline(f"O{index}", point_1, point_2, False))
+    return polylines
+
+
+def fuzz_instance(
+    rng: random.Random, polylines: List[Polyline]
+) -> List[Polyline]:
+    """Create a variant of an instance with duplicated, reversed or moved
+    polylines."""
+    fuzzed = []
+    for polyline in polylines:
+        choice = rng.randrange(4)
+        if choice == 0:
+            fuzzed.extend([polyline] * rng.randint(2, 5))
+        elif choice == 1 and polyline.is_open:
+            fuzzed.append(
+                polyline._replace(start=polyline.end, end=polyline.start)
+            )
+        elif choice == 2:
+            shift = rng.randint(0, 10)
+            fuzzed.append(
+                polyline._replace(
+                    start=polyline.start._replace(x=polyline.start.x + shift),
+                    end=polyline.end._replace(x=polyline.end.x + shift),
+                )
+            )
+        else:
+            fuzzed.append(polyline)
+    return fuzzed
+
+
+def tiled_instance(
+    rng: random.Random, tile_size: int, copies: int
+) -> List[Polyline]:
+    """Create an instance made of copies of a few tiles shifted along X."""
+    tiles = [random_instance(rng, tile_size, max_x=20) for _ in range(2)]
+    polylines = []
+    offset = 0
+    for copy in range(copies):
+        for polyline in rng.choice(tiles):
+            polylines.append(
+                polyline._replace(
+                    name=f"{polyline.name}-{copy}",
+                    start=polyline.start._replace(x=polyline.start.x + offset),
+                    end=polyline.end._replace(x=polyline.end.x + offset),
+                )
+            )
+        offset += rng.randint(15, 30)
+    return polylines
+
+
+def degenerate_instances(rng: random.Random) -> Dict[str, List[Polyline]]:
+    """Create instances with unusual shapes."""
+    return {
+        "empty": [],
+        "all-closed": random_instance(rng, 30, closed_fraction=1.0),
+        "single-coordinate": [
+            Polyline(f"S{index}", Point(7, index), Point(7, 2 * index), False)
+            for index in range(20)
+        ],
+        "vertical": [
+            polyline._replace(end=polyline.end._replace(x=polyline.start.x))
+            for polyline in random_instance(rng, 30, closed_fraction=0.0)
+        ],
+        "huge-duplicates": [
+            Polyline(f"D{index}", Point(5, 0), Point(50, 0), False)
+            for index in range(200)
+        ]
+        + [Polyline("E", Point(50, 0), Point(90, 0), False)],
+    }
+
+
+def make_instances(
+    rng: random.Random, count: int, size: int
+) -> Dict[str, List[Polyline]]:
+    """Create a collection of random, fuzzed and degenerate instances."""
+    instances = degenerate_instances(rng)
+    for index in range(count):
+        polylines = random_instance(rng, rng.randint(1, size))
+        instances[f"random-{index}"] = polylines
+        instances[f"fuzzed-{index}"] = fuzz_instance(rng, polylines)
+        instances[f"tiled-{index}"] = tiled_instance(
+            rng, rng.randint(1, 5), rng.randint(1, 8)
+        )
+    return instances
+
+
+def _timed_solve(
+    solve: Callable[[List[Polyline]], List[SolutionStep]],
+    polylines: List[Polyline],
+) -> Tuple[List[SolutionStep], float]:
+    start_time = time.perf_counter()
+    steps = solve(list(polylines))
+    return steps, time.perf_counter() - start_time
+
+
+def compare_engine(
+    name: str, instances: Dict[str, List[Polyline]]
+) -> List[ComparisonResult]:
+    """Run an engine and the reference on all instances and compare them.
+
+    :raises InvalidSolution: if any of the solutions isn't valid.
+    :raises EngineMismatch: if the engine's X travel differs from the
+        reference.
+    """
+    results = []
+    for instance_name, polylines in instances.items():
+        reference_steps, reference_seconds = _timed_solve(
+            reference.optimize_x_moves, polylines
+        )
+        engine_steps, engine_seconds = _timed_solve(
+            ENGINES[name].solve, polylines
+        )
+        check_solution(polylines, reference_steps)
+        check_solution(polylines, engine_steps)
+        reference_travel = x_travel(reference_steps)
+        engine_travel = x_travel(engine_steps)
+        if engine_travel != reference_travel:
+            raise EngineMismatch(
+                f"{name} on {instance_name}: X travel {engine_travel}, "
+                f"expected {reference_travel}"
+            )
+        results.append(
+            ComparisonResult(
+                name,
+                instance_name,
+                engine_travel,
+                reference_seconds,
+                engine_seconds,
+            )
+        )
+    return results
+
+
+def compare_coarse(
+    bucket_width: int, instances: Dict[str, List[Polyline]]
+) -> List[ComparisonResult]:
+    """Run the coarse mode and an exact engine on all instances.
+
+    :raises InvalidSolution: if any of the solutions isn't valid.
+    :raises BoundExceeded: if the coarse X travel exceeds the exact one by
+        more than the reported bound.
+    """
+    results = []
+    for instance_name, polylines in instances.items():
+        exact_steps, exact_seconds = _timed_solve(
+            ENGINES[EXACT_ENGINE].solve, polylines
+        )
+        stats = SolverStats()
+        start_time = time.perf_counter()
+        coarse_steps = optimize_x_moves_coarse(
+            list(polylines), bucket_width, stats
+        )
+        coarse_seconds = time.perf_counter() - start_time
+        check_solution(polylines, exact_steps)
+        check_solution(polylines, coarse_steps)
+        coarse_travel = x_travel(coarse_steps)
+        extra_travel = coarse_travel - x_travel(exact_steps)
+        if extra_travel > stats.extra_travel_bound:
+            raise BoundExceeded(
+                f"bucket width {bucket_width} on {instance_name}: extra X "
+                f"travel {extra_travel}, bound {stats.extra_travel_bound}"
+            )
+        results.append(
+            ComparisonResult(
+                f"coarse-{bucket_width}",
+                instance_name,
+                coarse_travel,
+                exact_seconds,
+                coarse_seconds,
+            )
+        )
+    return results
+
+
+def measure_peak_memory(engine: Engine, polylines: List[Polyline]) -> int:
+    """Return the peak number of bytes allocated while running an engine."""
+    polylines = list(polylines)
+    tracemalloc.start()
+    try:
+        engine.solve(polylines)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def mean_speedup(results: Sequence[ComparisonResult]) -> float:
+    """Return the geometric mean of speedups."""
+    if not results:
+        return 1.0
+    return math.exp(
+        sum(math.log(result.speedup) for result in results) / len(results)
+    )
+
+
+def check_baseline(
+    speedups: Dict[str, float],
+    baseline: Dict[str, float],
+    tolerance: float = 0.2,
+) -> None:
+    """Check that no engine got slower than its baseline speedup.
+
+    :raises PerformanceRegression: if any engine is slower than its baseline
+        by more than `tolerance` (relative).
+    """
+    for name, speedup in speedups.items():
+        if name in baseline and speedup < baseline[name] * (1 - tolerance):
+            raise PerformanceRegression(
+                f"{name}: speedup {speedup:.2f}, baseline {baseline[name]:.2f}"
+            )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run all engines against the reference and report speedups."""
+    parser = argparse.ArgumentParser("Differential engine tester")
+    parser.add_argument("--engine", action="append", help="Engines to test")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--instances", type=int, default=20, help="Random instances"
+    )
+    parser.add_argument(
+        "--size", type=int, default=60, help="Max instance size"
+    )
+    parser.add_argument(
+        "--memory-size",
+        type=int,
+        help="Also report peak memory on a random instance of this size",
+    )
+    parser.add_argument(
+        "--bucket-width",
+        type=int,
+        action="append",
+        default=[],
+        help="Also compare the coarse mode with this bucket width",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help="JSON file with baseline speedups",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PREFIX",
+        help="Write a profile of all runs to PREFIX.pstats and PREFIX.folded",
+    )
+    parser.add_argument(
+        "--check-baseline",
+        action="store_true",
+        help="Fail if any speedup is lower than its baseline",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store measured speedups as the new baseline",
+    )
+    args = parser.parse_args(argv)
+
+    instances = make_instances(
+        random.Random(args.seed), args.instances, args.size
+    )
+    profiling: ContextManager[object] = (
+        profile(args.profile) if args.profile else nullcontext()
+    )
+    speedups = {}
+
+    def report(name: str, results: List[ComparisonResult]) -> None:
+        speedups[name] = mean_speedup(results)
+        print(f"{name}: {len(results)} instances, speedup {speedups[name]:.2f}")
+
+    with profiling:
+        for name in args.engine or sorted(
+            name for name, engine in ENGINES.items() if engine.is_available()
+        ):
+            report(name, compare_engine(name, instances))
+            if args.memory_size:
+                peak = measure_peak_memory(
+                    ENGINES[name],
+                    random_instance(random.Random(args.seed), args.memory_size),
+                )
+                print(f"{name}: peak memory {peak / 2 ** 20:.1f} MiB")
+        for bucket_width in args.bucket_width:
+            report(
+                f"coarse-{bucket_width}",
+                compare_coarse(bucket_width, instances),
+            )
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(
+                {name: round(speedup, 2) for name, speedup in speedups.items()},
+                baseline_file,
+                indent=2,
+                sort_keys=True,
+            )
+            baseline_file.write("\n")
+    elif args.check_baseline:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        try:
+            check_baseline(speedups, baseline)
+        except PerformanceRegression as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Registry of engines which solve the cutting problem.
+
+All engines find solutions with the same X travel but have different
+constant factors, so the best one depends on the size of the instance.
+"""
+
+import os
+import random
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from cut_optimizer.algorithms.clusters import is_single_cluster
+from cut_optimizer.algorithms.optimize_x_moves import (
+    BestCandidate,
+    build_graph,
+    find_fast_path,
+    iter_optimize_x_moves,
+    open_x_coords,
+    place_closed_polylines,
+    SolutionStep,
+    solve_by_sweep,
+    SolverStats,
+)
+from cut_optimizer.instance import Polyline
+from cut_optimizer.profiling import iter_phase
+
+AUTO_ENGINE = "auto"
+
+# Minimal number of distinct X coordinates for which the parallel engine is
+# expected to be faster than the fast one. Only scoring path ends is split
+# between processes. It takes time quadratic in the number of coordinates,
+# about 0.15 s for 500 of them, while polylines are sent to each worker and
+# it builds its own graph. This is a placeholder estimated from timings in a
+# single process, not calibrated on a machine with several cores.
+PARALLEL_THRESHOLD = 600
+
+
+class Engine(ABC):
+    """Algorithm which finds an order of cutting polylines."""
+
+    name = ""
+
+    def is_available(self) -> bool:
+        """Tell if the engine can be used in the current environment."""
+        return True
+
+    def solve(
+        self,
+        polylines: List[Polyline],
+        stats: Optional[SolverStats] = None,
+        rng: Optional[random.Random] = None,
+    ) -> List[SolutionStep]:
+        """Find an order of cutting which minimizes moves along the X axis.
+
+        If `stats` are given, the engine fills those which apply to it.
+        `rng` is used as by `optimize_x_moves`. Engines can be used from
+        several threads at once.
+        """
+        return list(self.iter_solve(polylines, stats, rng))
+
+    @abstractmethod
+    def iter_solve(
+        self,
+        polylines: List[Polyline],
+        stats: Optional[SolverStats] = None,
+        rng: Optional[random.Random] = None,
+    ) -> Iterator[SolutionStep]:
+        """Find the same solution as `solve` and generate its steps.
+
+        The solution is found and `stats` are filled before returning, so
+        steps can be written out as they're generated.
+        """
+
+
+ENGINES: Dict[str, Engine] = {}
+
+
+def register_engine(engine: Engine) -> Engine:
+    """Make an engine available under its name."""
+    assert engine.name and engine.name not in ENGINES
+    ENGINES[engine.name] = engine
+    return engine
+
+
+def get_engine(name: str, polylines: Optional[List[Polyline]] = None) -> Engine:
+    """Return an engine given its name.
+
+    For the `auto` engine, an engine is selected for the given polylines.
+
+    :raises KeyError: if there's no engine with the given name.
+    :raises ValueError: if the engine is not available.
+    """
+    if name == AUTO_ENGINE:
+        return select_engine(polylines or [])
+    engine = ENGINES[name]
+    if not engine.is_available():
+        raise ValueError(f"Engine {name} is not available")
+    return engine
+
+
+def select_engine(polylines: List[Polyline]) -> Engine:
+    """Select the engine which is expected to be the fastest.
+
+    The parallel engine is used only for big instances which can't be solved
+    with a fast path or split into clusters. Checks are done from the
+    cheapest one, so for most instances only X coordinates are counted
+    before the fast engine does its own checks.
+    """
+    parallel = ENGINES["parallel"]
+    if not parallel.is_available():
+        return ENGINES["fast"]
+    x_coords = {poly.start.x for poly in polylines if poly.is_open}
+    x_coords.update(poly.end.x for poly in polylines if poly.is_open)
+    if (
+        len(x_coords) >= PARALLEL_THRESHOLD
+        and find_fast_path(polylines) is None
+        and is_single_cluster(polylines)
+    ):
+        return parallel
+    return ENGINES["fast"]
+
+
+class FastEngine(Engine):
+    """The graph algorithm with fast paths and cached clusters."""
+
+    name = "fast"
+
+    def iter_solve(
+        self,
+        polylines: List[Polyline],
+        stats: Optional[SolverStats] = None,
+        rng: Optional[random.Random] = None,
+    ) -> Iterator[SolutionStep]:
+        return iter_optimize_x_moves(polylines, stats, rng=rng)
+
+
+class ParallelEngine(Engine):
+    """The graph algorithm with possible ends split between processes.
+
+    Worker processes are started by the first solve and reused by later
+    ones until `shutdown` is called.
+    """
+
+    name = "parallel"
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return self.max_workers > 1
+
+    def shutdown(self) -> None:
+        """Stop worker processes; they're started again when needed."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            return self._executor
+
+    def iter_solve(
+        self,
+        polylines: List[Polyline],
+        stats: Optional[SolverStats] = None,
+        rng: Optional[random.Random] = None,
+    ) -> Iterator[SolutionStep]:
+        fast_path = find_fast_path(polylines)
+        if stats is not None:
+            stats.fast_path = fast_path
+        if fast_path is not None:
+            return iter(solve_by_sweep(polylines))
+        # Vertices of the graph, found without building it.
+        open_coords = open_x_coords(polylines)
+        closed = (poly for poly in polylines if poly.is_closed)
+        vertex_coords = set(open_coords)
+        for _polyline, position in place_closed_polylines(open_coords, closed):
+            vertex_coords.add(position)
+        x_coords = sorted(vertex_coords)
+        # Interleave coordinates so that the work is split evenly.
+        chunks = [
+            x_coords[index :: self.max_workers]
+            for index in range(min(self.max_workers, len(x_coords)))
+        ]
+        if rng is None:
+            rng = random.Random()
+        # Workers can't share the generator, so each gets its own seed.
+        seeds = [rng.getrandbits(64) for _chunk in chunks]
+        best_end = BestCandidate[int](rng)
+        for penalty, end_x, weight in self._get_executor().map(
+            _best_end, [polylines] * len(chunks), chunks, seeds
+        ):
+            best_end.offer(penalty, end_x, weight)
+        assert best_end.item is not None
+        graph = build_graph(polylines, rng)
+        _penalty, path = graph.solve_for_end(graph.get_vertex(best_end.item))
+        return iter_phase("solution", graph.iter_solution(path))
+
+
+def _best_end(
+    polylines: List[Polyline], x_coords: List[int], seed: int
+) -> Tuple[int, int, int]:
+    """Find the best end of a path among given X coordinates.
+
+    :return: penalty of the best path, the X coordinate where it ends, and
+        the number of equally good ends it was chosen from.
+    """
+    rng = random.Random(seed)
+    graph = build_graph(polylines, rng)
+    best_end = BestCandidate[int](rng)
+    for x_coord in x_coords:
+        best_end.offer(
+            graph.penalty_for_end(graph.get_vertex(x_coord)), x_coord
+        )
+    assert best_end.cost is not None and best_end.item is not None
+    return best_end.cost, best_end.item, best_end.num_best
+
+
+register_engine(FastEngine())
+register_engine(ParallelEngine())
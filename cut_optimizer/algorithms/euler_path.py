@@ -1,58 +1,76 @@
 """Euler path finding."""
 
 import random
-import sys
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from cut_optimizer.graph import Edge, Graph, Vertex
+from cut_optimizer.graph import Edge, Graph, GraphView, Vertex
 
 
 class NoEulerPathFound(Exception):
     """Raised when no Euler path can be found."""
 
 
-def euler_path(graph: Graph, start: Vertex) -> List[Edge]:
+def euler_path(
+    graph: Graph, start: Vertex, rng: Optional[random.Random] = None
+) -> List[Edge]:
     """Return an Euler path in the graph starting from `start`.
 
+    Edges are chosen at random using `rng`. The graph itself is not
+    modified: used edges are removed from a copy-on-write view, so only
+    vertices reached by the path are copied, and each edge is picked in
+    constant amortized time.
+
     :raise: NoEulerPathFound if there's no Euler path starting at `start`.
     :return: list of edges which form the path.
     """
     assert start in graph.vertices
-    recursion_limit = sys.getrecursionlimit()
-    sys.setrecursionlimit(len(graph.edges) + recursion_limit)
-    try:
-        path, _end = _euler_path_for_connected_component(graph.clone(), start)
-        return path
-    finally:
-        sys.setrecursionlimit(recursion_limit)
-
-
-def _euler_path_for_connected_component(
-    graph: Graph, start: Vertex
-) -> Tuple[List[Edge], Vertex]:
-    # We'll maintain an invariant that `result` is a path from `start` to
-    # `result_end`. If we find a cycle from `start` to `start`, we prepend
-    # it to `result`. If we find a path from `start` to a dead end somewhere
-    # else, we'll append it to `result` and move `result_end` to a dead end.
-    result: List[Edge] = []
-    result_end = start
-
-    while graph.neighbors[start]:
-        edge = random.choice(list(graph.neighbors[start]))
-        graph.remove_edge(edge)
-        path, end = _euler_path_for_connected_component(
-            graph, edge.other_end(start)
-        )
-        if end == start:
-            # A cycle from start to start - prepend it to the result
-            result = [edge] + path + result
+    if rng is None:
+        rng = random.Random()
+    view = GraphView(graph)
+    # Edges at each vertex reached so far, which may be unused. Edges used
+    # from the other end are skipped when they are drawn.
+    edges_at: Dict[Vertex, List[Edge]] = {}
+
+    # Hierholzer's algorithm: walk along unused edges until getting stuck,
+    # then backtrack and add the edges walked back to the path. The path is
+    # built from its end, so it is reversed at the end.
+    stack: List[Tuple[Vertex, Optional[Edge]]] = [(start, None)]
+    reversed_path: List[Edge] = []
+    while stack:
+        vertex, edge_to_vertex = stack[-1]
+        if vertex not in edges_at:
+            edges_at[vertex] = list(view.neighbors[vertex])
+        edge = _pop_unused_edge(edges_at[vertex], view, rng)
+        if edge is not None:
+            view.remove_edge(edge)
+            stack.append((edge.other_end(vertex), edge))
         else:
-            # A path from start to somewhere else. If `result` already
-            # ends somewhere other than `start`, it means that the graph
-            # has more than one vertex of odd degree other than `start`.
-            # In this case, there's no Euler part starting at `start`.
-            if result_end != start:
-                raise NoEulerPathFound(start)
-            result = result + [edge] + path
-            result_end = end
-    return result, result_end
+            stack.pop()
+            if edge_to_vertex is not None:
+                reversed_path.append(edge_to_vertex)
+    path = reversed_path[::-1]
+
+    # If there's no Euler path starting at `start`, the edges are still all
+    # used, but they don't form a single path.
+    current = start
+    for edge in path:
+        if current not in (edge.vertex_1, edge.vertex_2):
+            raise NoEulerPathFound(start)
+        current = edge.other_end(current)
+    return path
+
+
+def _pop_unused_edge(
+    edges: List[Edge], view: GraphView, rng: random.Random
+) -> Optional[Edge]:
+    """Remove a random edge which is still in the view from a list.
+
+    :return: the edge or `None` if all edges in the list are used.
+    """
+    while edges:
+        index = rng.randrange(len(edges))
+        edges[index], edges[-1] = edges[-1], edges[index]
+        edge = edges.pop()
+        if edge in view.edges:
+            return edge
+    return None
@@ -3,14 +3,37 @@
 import bisect
 import random
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Tuple, Union
+from typing import (
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 from disjoint_set import DisjointSet
 
+from cut_optimizer.algorithms.clusters import (
+    CanonicalCluster,
+    CanonicalStep,
+    ClusterSolution,
+    ClusterSolutions,
+    SolutionCache,
+    split_into_clusters,
+)
 from cut_optimizer.algorithms.euler_path import euler_path
 from cut_optimizer.graph import Edge, Vertex
 from cut_optimizer.instance import Point, Polyline
 from cut_optimizer.labelled_graph import LabelledGraph
+from cut_optimizer.profiling import iter_phase, phase
+
+_Candidate = TypeVar("_Candidate")
 
 
 @dataclass
@@ -22,6 +45,21 @@ class SolutionStep:
     end: Point
 
 
+@dataclass
+class SolverStats:
+    """Information about how a solution was found."""
+
+    # Name of the specialized algorithm used instead of the graph, if any.
+    fast_path: Optional[str] = None
+    # Number of independent clusters of polylines.
+    clusters: int = 0
+    # Number of clusters whose solutions were found in the cache.
+    cached_clusters: int = 0
+    # Upper bound on how much longer the X travel is than the minimal one.
+    # Zero unless an approximate algorithm was used.
+    extra_travel_bound: int = 0
+
+
 class Penalty:
     """Penalty which to be associated with idle moves of the cutter."""
 
@@ -32,47 +70,364 @@ class Penalty:
         return f"Penalty({self.value})"
 
 
-class XCoordGraph(LabelledGraph[int, Union[Polyline, Penalty]]):
-    """Graph where vertices are X coordinates and edges and polylines."""
+class PolylineBundle:
+    """Open polylines which connect the same pair of X coordinates.
+
+    The polylines are cut one after another in alternating directions, so a
+    bundle of an odd number of polylines moves the cutter from one of the X
+    coordinates to the other one, just like a single polyline does.
+    """
+
+    def __init__(self, polylines: Sequence[Polyline]) -> None:
+        self.polylines = polylines
+
+    def __str__(self) -> str:
+        return f"PolylineBundle({len(self.polylines)})"
+
+
+class BestCandidate(Generic[_Candidate]):
+    """Keeps only the candidate with the lowest cost seen so far.
+
+    Ties are broken uniformly at random using reservoir sampling.
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None) -> None:
+        self.rng = random.Random() if rng is None else rng
+        self.cost: Optional[int] = None
+        self.item: Optional[_Candidate] = None
+        self.num_best = 0
+
+    def offer(self, cost: int, item: _Candidate, weight: int = 1) -> None:
+        """Consider a new candidate.
+
+        `weight` tells how many equally good candidates `item` was already
+        chosen from, which is useful to merge results of several selections.
+        """
+        if self.cost is None or cost < self.cost:
+            self.cost = cost
+            self.item = item
+            self.num_best = weight
+        elif cost == self.cost:
+            self.num_best += weight
+            if self.rng.randrange(self.num_best) < weight:
+                self.item = item
+
+
+class CoordinateIndex:
+    """Vertices of XCoordGraph sorted by their X coordinates.
+
+    Gaps between consecutive vertices are given by the position of the left
+    vertex and sorted by their lengths, with ties broken at random using
+    `rng`. The index depends only on the set of X coordinates, so it can be
+    used for any edges of the graph.
+    """
+
+    def __init__(
+        self, graph: "XCoordGraph", rng: Optional[random.Random] = None
+    ) -> None:
+        if rng is None:
+            rng = random.Random()
+        self.x_coords = sorted(graph.get_vertex_tags())
+        self.vertices = [graph.get_vertex(x_pos) for x_pos in self.x_coords]
+        self.positions = {
+            vertex: position for position, vertex in enumerate(self.vertices)
+        }
+        self.gaps = [
+            (x_2 - x_1, position)
+            for position, (x_1, x_2) in enumerate(
+                zip(self.x_coords, self.x_coords[1:])
+            )
+        ]
+        self.gaps.sort(key=lambda gap: (gap[0], rng.uniform(0, 1)))
+
+
+class EndPenalties:
+    """Finds penalties of paths with different ends without adding edges.
+
+    Penalty edges added by `add_required_penalties` only depend on parity of
+    degrees and those added by `make_connected` on components of the graph,
+    so both are computed once for the current edges of the graph. Penalties
+    are the same as if the edges were added.
+    """
+
+    def __init__(self, graph: "XCoordGraph") -> None:
+        self.index = graph.coordinate_index()
+        self.odd_degrees = [
+            not graph.is_even_degree(vertex) for vertex in self.index.vertices
+        ]
+        union_find = DisjointSet[Vertex]()
+        for edge in graph.edges:
+            union_find.union(edge.vertex_1, edge.vertex_2)
+        component_ids: Dict[Vertex, int] = {}
+        self.components = [
+            component_ids.setdefault(
+                union_find.find(vertex), len(component_ids)
+            )
+            for vertex in self.index.vertices
+        ]
+        self.num_components = len(component_ids)
+
+    def penalty(self, begin: Vertex, end: Vertex) -> int:
+        """Return the penalty of the best path from `begin` to `end`."""
+        x_coords = self.index.x_coords
+        components = self.components
+        parents = list(range(self.num_components))
+
+        def find(component: int) -> int:
+            while parents[component] != component:
+                parents[component] = parents[parents[component]]
+                component = parents[component]
+            return component
+
+        num_components = self.num_components
+        ends = set()
+        if begin != end:
+            ends = {self.index.positions[begin], self.index.positions[end]}
+        total_penalty = 0
+        needs_extra_edge = False
+        for position, odd_degree in enumerate(self.odd_degrees):
+            # Same as `add_required_penalties`, where the extra edge from the
+            # previous vertex changes the parity of this one.
+            needs_extra_edge = odd_degree != needs_extra_edge
+            if position in ends:
+                needs_extra_edge = not needs_extra_edge
+            if needs_extra_edge:
+                # After reaching the last vertex there should be no
+                # unfinished edge.
+                assert position + 1 < len(x_coords)
+                total_penalty += x_coords[position + 1] - x_coords[position]
+                root_1 = find(components[position])
+                root_2 = find(components[position + 1])
+                if root_1 != root_2:
+                    parents[root_1] = root_2
+                    num_components -= 1
+        for distance, position in self.index.gaps:
+            if num_components == 1:
+                break
+            root_1 = find(components[position])
+            root_2 = find(components[position + 1])
+            if root_1 != root_2:
+                parents[root_1] = root_2
+                num_components -= 1
+                total_penalty += 2 * distance
+        return total_penalty
+
+
+def closed_polyline_position(
+    x_coords: Sequence[int], polyline: Polyline
+) -> Union[int, Tuple[int, int]]:
+    """Find where a closed polyline is cut, given X coordinates of vertices.
+
+    A closed polyline is cut at the first vertex within its range of X
+    coordinates, or at its left end if it's to the right of all vertices.
+    Polylines which fit between two consecutive vertices are placed together
+    by `place_closed_polylines_between`.
+
+    :param x_coords: sorted X coordinates of vertices with open polylines.
+    :return: the X coordinate where the polyline is cut or the pair of X
+        coordinates of vertices it fits between.
+    """
+    assert polyline.is_closed
+    assert 0 <= polyline.start.x <= polyline.end.x
+    position = bisect.bisect_left(x_coords, polyline.start.x)
+    if position == len(x_coords):
+        return polyline.start.x
+    elif polyline.end.x >= x_coords[position]:
+        return x_coords[position]
+    assert position > 0
+    assert x_coords[position - 1] < polyline.start.x
+    assert polyline.end.x < x_coords[position]
+    return x_coords[position - 1], x_coords[position]
+
+
+def place_closed_polylines(
+    x_coords: Sequence[int], polylines: Iterable[Polyline]
+) -> Iterator[Tuple[Polyline, int]]:
+    """Find where closed polylines are cut, given X coordinates of vertices.
+
+    See `closed_polyline_position` for the arguments.
+
+    :return: an iterator of polylines and X coordinates where they are cut.
+    """
+    between: Dict[Tuple[int, int], List[Polyline]] = {}
+    for polyline in polylines:
+        position = closed_polyline_position(x_coords, polyline)
+        if isinstance(position, int):
+            yield polyline, position
+        elif position in between:
+            between[position].append(polyline)
+        else:
+            between[position] = [polyline]
+    for (start_x, end_x), group in between.items():
+        indexed = list(enumerate(group))
+        yield from place_closed_polylines_between(
+            sorted(indexed, key=lambda item: item[1].start.x),
+            sorted(indexed, key=lambda item: item[1].end.x, reverse=True),
+            start_x,
+            end_x,
+        )
+
 
-    def __init__(self) -> None:
+def place_closed_polylines_between(
+    by_start: Iterable[Tuple[int, Polyline]],
+    by_end: Iterable[Tuple[int, Polyline]],
+    start_x: int,
+    end_x: int,
+) -> Iterator[Tuple[Polyline, int]]:
+    """Find where closed polylines which fit between two X coordinates are cut.
+
+    Polylines are placed greedily from both ends of the interval, each at the
+    end of its range which is closer to the previously placed polyline, so
+    the cutter sweeps the interval once. Both arguments are the same group of
+    polylines, identified by unique integers: `by_start` sorted by the left
+    end of polylines and `by_end` sorted by the right end in reverse. They
+    are read in one pass each, so they may be streams. Only identifiers of
+    polylines placed from one side but not yet reached from the other side
+    are kept in memory.
+
+    :return: an iterator of polylines and X coordinates where they are cut.
+    """
+    starts = iter(by_start)
+    ends = iter(by_end)
+    placed_by_start: Set[int] = set()
+    placed_by_end: Set[int] = set()
+    next_start = next(starts, None)
+    next_end = next(ends, None)
+    while True:
+        while next_start is not None and next_start[0] in placed_by_end:
+            placed_by_end.remove(next_start[0])
+            next_start = next(starts, None)
+        while next_end is not None and next_end[0] in placed_by_start:
+            placed_by_start.remove(next_end[0])
+            next_end = next(ends, None)
+        if next_start is None or next_end is None:
+            assert next_start is None and next_end is None
+            return
+        left_id, left = next_start
+        right_id, right = next_end
+        assert start_x <= left.start.x and right.end.x <= end_x
+        if left.start.x - start_x < end_x - right.end.x:
+            start_x = left.start.x
+            yield left, start_x
+            placed_by_start.add(left_id)
+            next_start = next(starts, None)
+        else:
+            end_x = right.end.x
+            yield right, end_x
+            placed_by_end.add(right_id)
+            next_end = next(ends, None)
+
+
+def open_x_coords(polylines: Iterable[Polyline]) -> List[int]:
+    """Return sorted X coordinates of open polylines and of the origin.
+
+    These are the X coordinates `place_closed_polylines` expects.
+    """
+    x_coords = {0}
+    for polyline in polylines:
+        if polyline.is_open:
+            x_coords.add(polyline.start.x)
+            x_coords.add(polyline.end.x)
+    return sorted(x_coords)
+
+
+class XCoordGraph(LabelledGraph[int, Union[PolylineBundle, Penalty]]):
+    """Graph where vertices are X coordinates and edges and polylines.
+
+    Open polylines between the same pair of X coordinates are collapsed into
+    bundles, so the size of the graph depends on the number of distinct pairs
+    of coordinates rather than on the number of polylines.
+
+    Closed polylines would be self-loops which affect neither parity of
+    degrees nor connectivity, so they are kept outside of the graph and cut
+    when the path visits their vertex for the first time.
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None) -> None:
         super().__init__()
+        self.rng = random.Random() if rng is None else rng
+        self.closed_polylines: Dict[Vertex, List[Polyline]] = {}
+        # Built on demand and dropped whenever the set of vertices changes.
+        self._coordinate_index: Optional[CoordinateIndex] = None
+        # Built on demand and dropped whenever any edge changes.
+        self._end_penalties: Optional[EndPenalties] = None
         self.add_tagged_vertex(0)
 
+    def add_tagged_vertex(self, tag: int) -> Vertex:
+        """Override the method from the superclass to drop the index."""
+        self._coordinate_index = None
+        self._end_penalties = None
+        return super().add_tagged_vertex(tag)
+
+    def _unlink_vertex(self, vertex: Vertex) -> None:
+        self._coordinate_index = None
+        self._end_penalties = None
+        super()._unlink_vertex(vertex)
+
+    def _link_edge(self, edge: Edge) -> None:
+        self._end_penalties = None
+        super()._link_edge(edge)
+
+    def _unlink_edge(self, edge: Edge) -> None:
+        self._end_penalties = None
+        super()._unlink_edge(edge)
+
+    def coordinate_index(self) -> CoordinateIndex:
+        """Return vertices sorted by their X coordinates."""
+        if self._coordinate_index is None:
+            self._coordinate_index = CoordinateIndex(self, self.rng)
+        return self._coordinate_index
+
+    def add_polylines(self, polylines: Sequence[Polyline]) -> None:
+        """Add open and then closed polylines."""
+        self.add_open_polylines(poly for poly in polylines if poly.is_open)
+        self.add_closed_polylines(poly for poly in polylines if poly.is_closed)
+
     def add_open_polylines(self, polylines: Iterable[Polyline]) -> None:
         """Adds vertices and edges representing open polylines."""
+        by_x_coords: Dict[Tuple[int, int], List[Polyline]] = {}
         for polyline in polylines:
             assert polyline.is_open
-            vertex_1 = self._ensure_vertex(polyline.start.x)
-            vertex_2 = self._ensure_vertex(polyline.end.x)
-            self.add_tagged_edge(vertex_1, vertex_2, polyline)
+            x_coords = (
+                min(polyline.start.x, polyline.end.x),
+                max(polyline.start.x, polyline.end.x),
+            )
+            if x_coords in by_x_coords:
+                by_x_coords[x_coords].append(polyline)
+            else:
+                by_x_coords[x_coords] = [polyline]
+        for (x_1, x_2), bundle in by_x_coords.items():
+            if x_1 != x_2 and len(bundle) % 2 == 0:
+                # Cutting an even number of polylines would bring the cutter
+                # back to where it started so we need two edges to keep the
+                # parity of degrees the same as for separate polylines.
+                self.add_polyline_bundle(x_1, x_2, bundle[:-1])
+                self.add_polyline_bundle(x_1, x_2, bundle[-1:])
+            else:
+                self.add_polyline_bundle(x_1, x_2, bundle)
+
+    def add_polyline_bundle(
+        self, x_1: int, x_2: int, polylines: Sequence[Polyline]
+    ) -> None:
+        """Add a single edge representing a bundle of open polylines.
+
+        All polylines must connect `x_1` and `x_2`. Unless the two are equal,
+        the number of polylines must be odd.
+        """
+        assert polylines
+        assert x_1 == x_2 or len(polylines) % 2 == 1
+        vertex_1 = self._ensure_vertex(x_1)
+        vertex_2 = self._ensure_vertex(x_2)
+        self.add_tagged_edge(vertex_1, vertex_2, PolylineBundle(polylines))
 
     def add_closed_polylines(self, polylines: Iterable[Polyline]) -> None:
-        """Adds vertices and edges representing closed polylines.
+        """Adds closed polylines and vertices where they will be cut.
 
         This can be called only after all open polylines are already added.
         """
-        x_coords = sorted(self.get_vertex_tags())
-        to_add_between: Dict[Tuple[int, int], List[Polyline]] = {}
-        for polyline in polylines:
-            assert polyline.is_closed
-            assert 0 <= polyline.start.x <= polyline.end.x
-            position = bisect.bisect_left(x_coords, polyline.start.x)
-            if position == len(x_coords):
-                self.add_closed_polyline_at(polyline, polyline.start.x)
-            elif polyline.end.x >= x_coords[position]:
-                self.add_closed_polyline_at(polyline, x_coords[position])
-            else:
-                assert position > 0
-                assert x_coords[position - 1] < polyline.start.x
-                assert polyline.end.x < x_coords[position]
-                interval = (x_coords[position - 1], x_coords[position])
-                if interval in to_add_between:
-                    to_add_between[interval].append(polyline)
-                else:
-                    to_add_between[interval] = [polyline]
-        for (start_x, end_x), polylines_between in to_add_between.items():
-            self.add_closed_polylines_between(polylines_between, start_x, end_x)
+        x_coords = self.coordinate_index().x_coords
+        for polyline, position in place_closed_polylines(x_coords, polylines):
+            self.add_closed_polyline_at(polyline, position)
 
     def add_closed_polyline_at(self, polyline: Polyline, position: int) -> None:
         """Add one closed polyline to the graph.
@@ -82,61 +437,42 @@ class XCoordGraph(LabelledGraph[int, Union[Polyline, Penalty]]):
         """
         assert polyline.start.x <= position <= polyline.end.x
         vertex = self._ensure_vertex(position)
-        self.add_tagged_edge(vertex, vertex, polyline)
-
-    def add_closed_polylines_between(
-        self, polylines: List[Polyline], start_x: int, end_x: int,
-    ) -> None:
-        """Add closed polylines which fit between two x positions."""
-        by_start = sorted(polylines, key=lambda poly: poly.start.x)
-        by_end = sorted(polylines, key=lambda poly: poly.end.x, reverse=True)
-        while by_start:
-            assert by_end
-            assert by_start[0].start.x >= start_x
-            assert by_end[0].end.x <= end_x
-            if by_start[0].start.x - start_x < end_x - by_end[0].end.x:
-                polyline = by_start[0]
-                position = polyline.start.x
-                start_x = polyline.start.x
-            else:
-                polyline = by_end[0]
-                position = polyline.end.x
-                end_x = polyline.end.x
-            self.add_closed_polyline_at(polyline, position)
-            by_start.remove(polyline)
-            by_end.remove(polyline)
-        assert not by_end
-
-    def remove_penalty_edges(self) -> None:
-        """Remove all penalty edges from the graph."""
-        penalty_edges = [
-            edge
-            for edge in self.edges
-            if isinstance(self.get_tag(edge), Penalty)
-        ]
-        for edge in penalty_edges:
-            self.remove_edge(edge)
-
-    def add_required_penalties(self, begin: Vertex, end: Vertex) -> None:
+        if vertex in self.closed_polylines:
+            self.closed_polylines[vertex].append(polyline)
+        else:
+            self.closed_polylines[vertex] = [polyline]
+        self._log_undo(lambda: self._remove_last_closed_polyline(vertex))
+
+    def _remove_last_closed_polyline(self, vertex: Vertex) -> None:
+        closed = self.closed_polylines[vertex]
+        closed.pop()
+        if not closed:
+            del self.closed_polylines[vertex]
+
+    def add_required_penalties(self, begin: Vertex, end: Vertex) -> int:
         """Add penalty edges - phase 1
 
         Add penalty edges between vertices to ensure that any vertex different
         than the begin and end of the path has even degree.
+
+        :return: the total value of added penalties.
         """
         # We want to ensure that there's an Euler path from begin to end which
         # means that any vertex other than the two needs to be of an even
         # degree, and that the degree of both `begin` and `end` is odd, unless
         # they are the same vertex.
-        edge_begin: Optional[int] = None
-        for x_pos in sorted(self.get_vertex_tags()):
-            vertex = self.get_vertex(x_pos)
-
+        index = self.coordinate_index()
+        total_penalty = 0
+        edge_begin: Optional[Tuple[int, Vertex]] = None
+        for x_pos, vertex in zip(index.x_coords, index.vertices):
             # If the previous vertex required an extra edge, it must end at
             # this vertex so end it here.
             if edge_begin is not None:
+                begin_x, begin_vertex = edge_begin
                 self.add_tagged_edge(
-                    edge_begin, vertex, Penalty(x_pos - edge_begin)
+                    begin_vertex, vertex, Penalty(x_pos - begin_x)
                 )
+                total_penalty += x_pos - begin_x
                 edge_begin = None
 
             # If the parity of the current vertex is not what we want, we'll
@@ -146,52 +482,68 @@ class XCoordGraph(LabelledGraph[int, Union[Polyline, Penalty]]):
             else:
                 needs_extra_edge = not self.is_even_degree(vertex)
             if needs_extra_edge:
-                edge_begin = x_pos
+                edge_begin = (x_pos, vertex)
 
         # After reaching the last vertex there should be no unfinished edge.
         assert edge_begin is None
+        return total_penalty
 
-    def make_connected(self) -> None:
-        """Add minimal edges to make the graph connected."""
-        # Create a collection of all edges which connect consecutive vertices.
-        # For each such edge remember its length because we'll try to use the
-        # shortest of them to connect components of the graph.
-        candidate_edges: List[Tuple[int, Vertex, Vertex]] = []
-        x_coords = sorted(self.get_vertex_tags())
-        for x_1, x_2 in zip(x_coords, x_coords[1:]):
-            vertex_1 = self.get_vertex(x_1)
-            vertex_2 = self.get_vertex(x_2)
-            candidate_edges.append((abs(x_2 - x_1), vertex_1, vertex_2))
-        candidate_edges.sort(
-            key=lambda candidate: (candidate[0], random.uniform(0, 1))
-        )
+    def make_connected(self) -> int:
+        """Add minimal edges to make the graph connected.
 
+        :return: the total value of added penalties.
+        """
+        # Edges which connect consecutive vertices are candidates, and we'll
+        # try to use the shortest of them to connect components of the graph.
+        index = self.coordinate_index()
+        total_penalty = 0
         union_find = DisjointSet[Vertex]()
         for edge in self.edges:
             union_find.union(edge.vertex_1, edge.vertex_2)
-        for distance, vertex_1, vertex_2 in candidate_edges:
+        for distance, position in index.gaps:
+            vertex_1 = index.vertices[position]
+            vertex_2 = index.vertices[position + 1]
             if not union_find.connected(vertex_1, vertex_2):
                 # This step is performed after fixing the parity of degrees of
                 # each vertex. At this stage we don't want to change any
                 # partities so we need to add two edges.
                 self.add_tagged_edge(vertex_1, vertex_2, Penalty(distance))
                 self.add_tagged_edge(vertex_1, vertex_2, Penalty(distance))
+                total_penalty += 2 * distance
                 union_find.union(vertex_1, vertex_2)
+        return total_penalty
+
+    def closed_polylines_at(self, vertex: Vertex) -> Sequence[Polyline]:
+        """Return closed polylines which are cut at a given vertex."""
+        return self.closed_polylines.get(vertex, ())
 
     def path_to_solution(self, path: List[Edge]) -> List[SolutionStep]:
         """Get a solution which corresponds to a given Euler path."""
-        solution = []
+        return list(self.iter_solution(path))
+
+    def iter_solution(self, path: List[Edge]) -> Iterator[SolutionStep]:
+        """Generate steps of the solution for a given Euler path one by one."""
+        visited: Set[Vertex] = set()
+
+        def visit(vertex: Vertex) -> Iterator[SolutionStep]:
+            if vertex not in visited:
+                visited.add(vertex)
+                current_x = self.get_tag(vertex)
+                for polyline in self.closed_polylines_at(vertex):
+                    start = Point(current_x, polyline.start.y)
+                    yield SolutionStep(polyline, start, start)
+
         current_pos = self.get_vertex(0)
+        yield from visit(current_pos)
         for edge in path:
             next_pos = edge.other_end(current_pos)
-            edge_tag = self.get_tag(edge)
-            if isinstance(edge_tag, Polyline):
+            # Penalty edges are removed from the graph after solving, so they
+            # may not have tags anymore.
+            edge_tag = self.edge_tags.get(edge)
+            if isinstance(edge_tag, PolylineBundle):
+                # Polylines in a bundle are cut in alternating directions.
                 current_x = self.get_tag(current_pos)
-                polyline = edge_tag
-                if polyline.is_closed:
-                    start = Point(current_x, polyline.start.y)
-                    end = start
-                else:
+                for polyline in edge_tag.polylines:
                     assert current_x in (polyline.start.x, polyline.end.x)
                     if current_x == polyline.start.x:
                         start = polyline.start
@@ -199,25 +551,63 @@ class XCoordGraph(LabelledGraph[int, Union[Polyline, Penalty]]):
                     else:
                         start = polyline.end
                         end = polyline.start
-                solution.append(SolutionStep(polyline, start, end))
+                    yield SolutionStep(polyline, start, end)
+                    current_x = end.x
             current_pos = next_pos
-        return solution
+            yield from visit(current_pos)
 
     def path_to_penalty(self, path: List[Edge]) -> int:
         """Get the total penalty of a given Euler path."""
         tags = [self.get_tag(edge) for edge in path]
         return sum(tag.value for tag in tags if isinstance(tag, Penalty))
 
-    def solve_for_end(self, path_end: Vertex) -> Tuple[int, List[SolutionStep]]:
-        """Find the best solution that ends on the given vertex."""
+    def solve_for_end(self, path_end: Vertex) -> Tuple[int, List[Edge]]:
+        """Find the best path that ends on the given vertex.
+
+        Penalty edges needed to find the path are removed from the graph
+        before returning, so only `path_to_solution` can be used on the path.
+
+        :return: penalty of the path and the path itself.
+        """
         path_begin = self.get_vertex(0)
-        self.add_required_penalties(path_begin, path_end)
-        self.make_connected()
-        path = euler_path(self, path_begin)
-        penalty = self.path_to_penalty(path)
-        solution = self.path_to_solution(path)
-        self.remove_penalty_edges()
-        return penalty, solution
+        with self.transaction():
+            with phase("required penalties"):
+                self.add_required_penalties(path_begin, path_end)
+            with phase("connect"):
+                self.make_connected()
+            with phase("euler"):
+                path = euler_path(self, path_begin, self.rng)
+            penalty = self.path_to_penalty(path)
+        return penalty, path
+
+    def penalty_for_end(self, path_end: Vertex) -> int:
+        """Find the penalty of the best path that ends on the given vertex.
+
+        Every Euler path uses all penalty edges, so the penalty is known
+        without finding the path, or even adding the edges, which is much
+        cheaper.
+        """
+        if self._end_penalties is None:
+            self._end_penalties = EndPenalties(self)
+        return self._end_penalties.penalty(self.get_vertex(0), path_end)
+
+    def penalties_for_all_ends(self) -> Iterator[Tuple[Vertex, int]]:
+        """Find the penalty of the best path for each possible end.
+
+        :return: an iterator of path ends and penalties.
+        """
+        for vertex in list(self.vertices):
+            yield vertex, self.penalty_for_end(vertex)
+
+    def find_best_path(self) -> List[Edge]:
+        """Find the path with the lowest penalty among all possible ends."""
+        best_end = BestCandidate[Vertex](self.rng)
+        with phase("end scoring"):
+            for end, penalty in self.penalties_for_all_ends():
+                best_end.offer(penalty, end)
+        assert best_end.item is not None
+        _penalty, path = self.solve_for_end(best_end.item)
+        return path
 
     def _ensure_vertex(self, x_coordinate: int) -> Vertex:
         """Create vertex for a given X coordinate if not exists
@@ -230,16 +620,244 @@ class XCoordGraph(LabelledGraph[int, Union[Polyline, Penalty]]):
             return self.add_tagged_vertex(x_coordinate)
 
 
-def optimize_x_moves(polylines: List[Polyline]) -> List[SolutionStep]:
-    """Find an order of cutting which minimizes moves along the X axis."""
-    graph = XCoordGraph()
-    graph.add_open_polylines(poly for poly in polylines if poly.is_open)
-    graph.add_closed_polylines(poly for poly in polylines if poly.is_closed)
-    solutions = sorted(
-        [graph.solve_for_end(vertex) for vertex in graph.vertices],
-        key=lambda penalty_and_solution: (
-            penalty_and_solution[0],
-            random.uniform(0, 1),
-        ),
+def build_graph(
+    polylines: List[Polyline], rng: Optional[random.Random] = None
+) -> XCoordGraph:
+    """Create a graph representing given polylines."""
+    with phase("graph build"):
+        graph = XCoordGraph(rng)
+        graph.add_polylines(polylines)
+    return graph
+
+
+def solve_with_graph(
+    polylines: List[Polyline], rng: Optional[random.Random] = None
+) -> List[SolutionStep]:
+    """Find an order of cutting using XCoordGraph for any instance."""
+    graph = build_graph(polylines, rng)
+    path = graph.find_best_path()
+    with phase("solution"):
+        return graph.path_to_solution(path)
+
+
+def find_fast_path(polylines: List[Polyline]) -> Optional[str]:
+    """Tell which specialized algorithm can solve a given instance.
+
+    :return: name of the algorithm or `None` if the graph needs to be used.
+    """
+    open_x_coords = set()
+    for polyline in polylines:
+        if polyline.is_open:
+            if polyline.start.x != polyline.end.x:
+                return None
+            open_x_coords.add(polyline.start.x)
+    if not open_x_coords:
+        return "closed-only"
+    elif len(open_x_coords) == 1:
+        return "single-x"
+    else:
+        return "vertical-only"
+
+
+def solve_by_sweep(polylines: List[Polyline]) -> List[SolutionStep]:
+    """Solve an instance where no polyline requires moving along X.
+
+    This is the case when all open polylines are vertical. Each polyline can
+    be cut at its minimal X coordinate, and the cutter has to reach the
+    largest of them anyway, so cutting them from left to right is optimal.
+    """
+    return [
+        SolutionStep(
+            polyline,
+            polyline.start,
+            polyline.start if polyline.is_closed else polyline.end,
+        )
+        for polyline in sorted(polylines, key=lambda poly: poly.start.x)
+    ]
+
+
+def solve_canonical_cluster(
+    polylines: List[Polyline], rng: random.Random
+) -> ClusterSolutions:
+    """Find solutions of a canonical cluster which starts at X = 0."""
+    graph = build_graph(polylines, rng)
+    right_x = max(graph.get_vertex_tags())
+    begin = graph.get_vertex(0)
+    best_passing = BestCandidate[Vertex](rng)
+    best_ending = BestCandidate[Vertex](rng)
+    with phase("end scoring"):
+        for end, penalty in graph.penalties_for_all_ends():
+            best_passing.offer(penalty + right_x - graph.get_tag(end), end)
+            best_ending.offer(penalty, end)
+
+    def to_cluster_solution(
+        path_end: Vertex, extra_penalty: int
+    ) -> ClusterSolution:
+        penalty, path = graph.solve_for_end(path_end)
+        with phase("solution"):
+            steps = [
+                (int(step.polyline.name), step.start, step.end)
+                for step in graph.path_to_solution(path)
+            ]
+        split = len(steps)
+        for index, (_polyline, start, end) in enumerate(steps):
+            if start.x == right_x:
+                split = index
+                break
+            if end.x == right_x:
+                split = index + 1
+                break
+        return ClusterSolution(steps, penalty + extra_penalty, split)
+
+    assert best_passing.item is not None and best_ending.item is not None
+    passing_end = best_passing.item
+    return ClusterSolutions(
+        right_x,
+        to_cluster_solution(passing_end, right_x - graph.get_tag(passing_end)),
+        to_cluster_solution(best_ending.item, 0),
+        to_cluster_solution(begin, 0),
     )
-    return solutions[0][1]
+
+
+def solve_by_clusters(
+    polylines: List[Polyline],
+    cache: SolutionCache,
+    stats: Optional[SolverStats] = None,
+    rng: Optional[random.Random] = None,
+) -> Iterator[SolutionStep]:
+    """Solve clusters of polylines separately and combine their solutions.
+
+    The cutter passes through clusters from left to right until it reaches
+    the cluster where it ends. From there it visits all clusters further to
+    the right and comes back. The cluster where the cutter ends is chosen to
+    minimize the total penalty. Solutions of clusters are taken from `cache`
+    if possible and stored in it otherwise.
+
+    Clusters are solved before returning, and steps are restored from their
+    solutions one by one.
+    """
+    if rng is None:
+        rng = random.Random()
+    with phase("clusters"):
+        clusters = [
+            CanonicalCluster(cluster)
+            for cluster in split_into_clusters(polylines)
+        ]
+    solutions = []
+    for cluster in clusters:
+        try:
+            solutions.append(cache.solutions[cluster.key])
+            if stats is not None:
+                stats.cached_clusters += 1
+        except KeyError:
+            solution = solve_canonical_cluster(
+                cluster.canonical_polylines(), rng
+            )
+            cache.solutions[cluster.key] = solution
+            solutions.append(solution)
+    if stats is not None:
+        stats.clusters = len(clusters)
+    if not clusters:
+        return iter(())
+
+    # Distance from the right end of each cluster to the next cluster.
+    gaps = [
+        next_cluster.shift - cluster.shift - solution.right_x
+        for cluster, next_cluster, solution in zip(
+            clusters, clusters[1:], solutions
+        )
+    ]
+    # Cost of getting to the beginning of each cluster while passing through
+    # all clusters on its left.
+    passing_costs = [clusters[0].shift]
+    for solution, gap in zip(solutions, gaps):
+        passing_costs.append(passing_costs[-1] + solution.passing.penalty + gap)
+    # Cost of visiting each cluster and all clusters on its right, starting
+    # and finishing at the beginning of the cluster.
+    returning_costs = [solutions[-1].returning.penalty]
+    for solution, gap in zip(reversed(solutions[:-1]), reversed(gaps)):
+        returning_costs.append(
+            returning_costs[-1] + solution.returning.penalty + 2 * gap
+        )
+    returning_costs.reverse()
+    returning_costs.append(0)
+
+    best_end = BestCandidate[int](rng)
+    for index, solution in enumerate(solutions):
+        cost = passing_costs[index] + solution.ending.penalty
+        if index + 1 < len(clusters):
+            cost += 2 * gaps[index] + returning_costs[index + 1]
+        best_end.offer(cost, index)
+    assert best_end.item is not None
+    end = best_end.item
+
+    # Clusters from the one where the cutter ends to the rightmost one are
+    # nested: each of them is interrupted to visit the ones on its right.
+    nested = [solutions[end].ending] + [
+        solutions[index].returning for index in range(end + 1, len(clusters))
+    ]
+
+    def restore(
+        index: int, steps: List[CanonicalStep]
+    ) -> Iterator[SolutionStep]:
+        for polyline, start, step_end in clusters[index].restore(steps):
+            yield SolutionStep(polyline, start, step_end)
+
+    def restore_all() -> Iterator[SolutionStep]:
+        for index in range(end):
+            yield from restore(index, solutions[index].passing.steps)
+        for index, nested_solution in enumerate(nested, start=end):
+            yield from restore(
+                index, nested_solution.steps[: nested_solution.split]
+            )
+        for index, nested_solution in reversed(
+            list(enumerate(nested, start=end))
+        ):
+            yield from restore(
+                index, nested_solution.steps[nested_solution.split :]
+            )
+
+    return iter_phase("restore clusters", restore_all())
+
+
+def optimize_x_moves(
+    polylines: List[Polyline],
+    stats: Optional[SolverStats] = None,
+    cache: Optional[SolutionCache] = None,
+    rng: Optional[random.Random] = None,
+) -> List[SolutionStep]:
+    """Find an order of cutting which minimizes moves along the X axis.
+
+    If `stats` are given, they are filled with information about the solving
+    process. Solutions of repeated clusters of polylines are reused within a
+    single call, and across calls if they share the same `cache`.
+
+    Ties between equally good solutions are broken using `rng`, or a new
+    unseeded generator if it's not given, so a seeded generator makes the
+    result reproducible. A shared `cache` holds clusters solved with ties
+    broken by earlier calls, so a seeded result is reproducible only with a
+    new cache, or none. No global state is used, so calls with separate
+    generators can run concurrently in threads.
+    """
+    return list(iter_optimize_x_moves(polylines, stats, cache, rng))
+
+
+def iter_optimize_x_moves(
+    polylines: List[Polyline],
+    stats: Optional[SolverStats] = None,
+    cache: Optional[SolutionCache] = None,
+    rng: Optional[random.Random] = None,
+) -> Iterator[SolutionStep]:
+    """Find the same solution as `optimize_x_moves` and generate its steps.
+
+    The solution is found and `stats` are filled before returning, so only
+    building the steps is left to the returned iterator.
+    """
+    fast_path = find_fast_path(polylines)
+    if stats is not None:
+        stats.fast_path = fast_path
+    if fast_path is not None:
+        return iter(solve_by_sweep(polylines))
+    if cache is None:
+        cache = SolutionCache()
+    return solve_by_clusters(polylines, cache, stats, rng)
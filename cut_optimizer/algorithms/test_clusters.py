@@ -0,0 +1,51 @@
+"""Tests for clusters.py."""
+
+from cut_optimizer.algorithms.clusters import (
+    CanonicalCluster,
+    is_single_cluster,
+    split_into_clusters,
+)
+from cut_optimizer.instance import Point, Polyline
+
+
+def test_split_into_clusters() -> None:
+    """Test splitting polylines into clusters with disjoint X ranges."""
+    polylines = [
+        Polyline("A", Point(10, 0), Point(1, 0), is_closed=False),
+        Polyline("B", Point(12, 0), Point(15, 5), is_closed=True),
+        Polyline("C", Point(10, 0), Point(11, 0), is_closed=False),
+        Polyline("D", Point(16, 0), Point(16, 7), is_closed=False),
+        Polyline("E", Point(15, 0), Point(13, 0), is_closed=False),
+    ]
+    clusters = split_into_clusters(polylines)
+    assert [[poly.name for poly in cluster] for cluster in clusters] == [
+        ["A", "C"],
+        ["B", "E"],
+        ["D"],
+    ]
+    assert not is_single_cluster(polylines)
+    assert is_single_cluster(polylines[2:3] + polylines[:1])
+    assert is_single_cluster([])
+
+
+def test_canonical_cluster() -> None:
+    """Test that shifted and renamed clusters have the same canonical form."""
+    cluster_1 = CanonicalCluster(
+        [
+            Polyline("A", Point(5, 0), Point(7, 1), is_closed=False),
+            Polyline("B", Point(6, 2), Point(9, 3), is_closed=True),
+        ]
+    )
+    cluster_2 = CanonicalCluster(
+        [
+            Polyline("X", Point(106, 2), Point(109, 3), is_closed=True),
+            Polyline("Y", Point(105, 0), Point(107, 1), is_closed=False),
+        ]
+    )
+    assert cluster_1.key == cluster_2.key
+    assert cluster_2.canonical_polylines() == [
+        Polyline("0", Point(0, 0), Point(2, 1), is_closed=False),
+        Polyline("1", Point(1, 2), Point(4, 3), is_closed=True),
+    ]
+    restored = cluster_2.restore([(1, Point(2, 2), Point(2, 2))])
+    assert restored == [(cluster_2.polylines[1], Point(107, 2), Point(107, 2))]
@@ -0,0 +1,129 @@
+"""Tests for coarse.py."""
+
+import random
+
+from cut_optimizer.algorithms.coarse import (
+    closed_positions,
+    optimize_x_moves_coarse,
+    refine_solution,
+    snap,
+)
+from cut_optimizer.algorithms.differential import (
+    check_solution,
+    make_instances,
+    random_instance,
+    x_travel,
+)
+from cut_optimizer.algorithms.optimize_x_moves import (
+    optimize_x_moves,
+    SolutionStep,
+    SolverStats,
+)
+from cut_optimizer.instance import Point, Polyline
+
+
+def test_snap() -> None:
+    """Test moving X coordinates to the beginnings of buckets."""
+    assert [snap(x_coord, 5) for x_coord in [0, 4, 5, 9, 12]] == [
+        0,
+        0,
+        5,
+        5,
+        10,
+    ]
+
+
+def test_closed_positions() -> None:
+    """Test finding where closed polylines are cut by the graph."""
+    polylines = [
+        Polyline("A", Point(3, 0), Point(9, 0), is_closed=False),
+        Polyline("B", Point(2, 1), Point(5, 2), is_closed=True),
+        Polyline("C", Point(12, 1), Point(15, 2), is_closed=True),
+    ]
+    assert closed_positions(polylines) == [None, 3, 12]
+
+
+def test_refine_solution() -> None:
+    """Test improving cut positions and directions of steps."""
+    open_polyline = Polyline("A", Point(10, 0), Point(2, 0), is_closed=False)
+    closed_polyline = Polyline("B", Point(4, 0), Point(8, 5), is_closed=True)
+    steps = [
+        SolutionStep(closed_polyline, Point(8, 0), Point(8, 0)),
+        SolutionStep(open_polyline, Point(10, 0), Point(2, 0)),
+    ]
+    refined = refine_solution(steps)
+    assert refined == [
+        SolutionStep(closed_polyline, Point(4, 0), Point(4, 0)),
+        SolutionStep(open_polyline, Point(2, 0), Point(10, 0)),
+    ]
+    assert x_travel(refined) < x_travel(steps)
+
+
+def test_refine_solution_sweeps_buckets() -> None:
+    """Test reordering steps which stay within one bucket."""
+    polyline_a = Polyline("A", Point(1, 0), Point(2, 0), is_closed=False)
+    polyline_b = Polyline("B", Point(7, 0), Point(8, 0), is_closed=False)
+    polyline_c = Polyline("C", Point(4, 0), Point(3, 0), is_closed=False)
+    steps = [
+        SolutionStep(polyline_a, Point(1, 0), Point(2, 0)),
+        SolutionStep(polyline_b, Point(7, 0), Point(8, 0)),
+        SolutionStep(polyline_c, Point(4, 0), Point(3, 0)),
+    ]
+    assert refine_solution(steps, bucket_width=10) == [
+        SolutionStep(polyline_a, Point(1, 0), Point(2, 0)),
+        SolutionStep(polyline_c, Point(3, 0), Point(4, 0)),
+        SolutionStep(polyline_b, Point(7, 0), Point(8, 0)),
+    ]
+
+
+def test_refine_solution_reverses_segments() -> None:
+    """Test reversing steps between idle moves within one bucket."""
+    polyline_a = Polyline("A", Point(9, 0), Point(15, 0), is_closed=False)
+    polyline_b = Polyline("B", Point(15, 0), Point(1, 0), is_closed=False)
+    polyline_c = Polyline("C", Point(2, 0), Point(30, 0), is_closed=False)
+    steps = [
+        SolutionStep(polyline_a, Point(9, 0), Point(15, 0)),
+        SolutionStep(polyline_b, Point(15, 0), Point(1, 0)),
+        SolutionStep(polyline_c, Point(2, 0), Point(30, 0)),
+    ]
+    refined = refine_solution(steps, bucket_width=10)
+    assert refined == [
+        SolutionStep(polyline_b, Point(1, 0), Point(15, 0)),
+        SolutionStep(polyline_a, Point(15, 0), Point(9, 0)),
+        SolutionStep(polyline_c, Point(2, 0), Point(30, 0)),
+    ]
+    assert x_travel(refined) < x_travel(steps)
+
+
+def test_refine_solution_never_increases_travel() -> None:
+    """Test that refined solutions are valid and not longer."""
+    rng = random.Random(0)
+    for polylines in make_instances(rng, count=5, size=40).values():
+        steps = optimize_x_moves(polylines, rng=rng)
+        rng.shuffle(steps)
+        for bucket_width in [1, 10, 50]:
+            refined = refine_solution(steps, bucket_width)
+            check_solution(polylines, refined)
+            assert x_travel(refined) <= x_travel(steps)
+
+
+def test_extra_travel_is_bounded() -> None:
+    """Test that coarse solutions are within their bounds."""
+    instances = make_instances(random.Random(0), count=5, size=40)
+    for polylines in instances.values():
+        exact_travel = x_travel(optimize_x_moves(polylines))
+        for bucket_width in [1, 3, 10, 50]:
+            stats = SolverStats()
+            steps = optimize_x_moves_coarse(polylines, bucket_width, stats)
+            check_solution(polylines, steps)
+            assert x_travel(steps) - exact_travel <= stats.extra_travel_bound
+            if bucket_width == 1:
+                assert stats.extra_travel_bound == 0
+
+
+def test_refinement_reorders_coarse_solutions() -> None:
+    """Test that refinement keeps wide buckets close to the exact travel."""
+    polylines = random_instance(random.Random(0), 300, max_x=10**4)
+    exact_travel = x_travel(optimize_x_moves(polylines))
+    steps = optimize_x_moves_coarse(polylines, 100, rng=random.Random(0))
+    assert x_travel(steps) < 2 * exact_travel
@@ -0,0 +1,147 @@
+"""Tests for differential.py."""
+
+import json
+import random
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import pytest
+
+from cut_optimizer.algorithms import differential
+from cut_optimizer.algorithms.differential import (
+    BoundExceeded,
+    check_baseline,
+    check_solution,
+    compare_coarse,
+    compare_engine,
+    EngineMismatch,
+    InvalidSolution,
+    main,
+    make_instances,
+    PerformanceRegression,
+    x_travel,
+)
+from cut_optimizer.algorithms.engines import Engine, ENGINES
+from cut_optimizer.algorithms.optimize_x_moves import (
+    optimize_x_moves,
+    SolutionStep,
+    SolverStats,
+)
+from cut_optimizer.instance import Point, Polyline
+
+_A = Polyline("A", Point(1, 0), Point(5, 0), is_closed=False)
+_B = Polyline("B", Point(2, 0), Point(4, 4), is_closed=True)
+
+
+def test_x_travel() -> None:
+    """Test computing X travel of a solution."""
+    steps = [
+        SolutionStep(_A, _A.end, _A.start),
+        SolutionStep(_B, Point(3, 0), Point(3, 0)),
+    ]
+    assert x_travel(steps) == 5 + 2
+
+
+def test_check_solution() -> None:
+    """Test that invalid solutions are detected."""
+    check_solution(
+        [_A, _B],
+        [
+            SolutionStep(_A, _A.start, _A.end),
+            SolutionStep(_B, Point(2, 0), Point(2, 0)),
+        ],
+    )
+    with pytest.raises(InvalidSolution):
+        check_solution([_A, _B], [SolutionStep(_A, _A.start, _A.end)])
+    with pytest.raises(InvalidSolution):
+        check_solution(
+            [_A, _B],
+            [
+                SolutionStep(_A, _A.start, _A.start),
+                SolutionStep(_B, Point(2, 0), Point(2, 0)),
+            ],
+        )
+    with pytest.raises(InvalidSolution):
+        check_solution(
+            [_A, _B],
+            [
+                SolutionStep(_A, _A.start, _A.end),
+                SolutionStep(_B, Point(5, 0), Point(5, 0)),
+            ],
+        )
+
+
+class _ReversedEngine(Engine):
+    """Engine which returns steps in a wrong order."""
+
+    name = "reversed"
+
+    def iter_solve(
+        self,
+        polylines: List[Polyline],
+        stats: Optional[SolverStats] = None,
+        rng: Optional[random.Random] = None,
+    ) -> Iterator[SolutionStep]:
+        return reversed(optimize_x_moves(polylines, rng=rng))
+
+
+def test_compare_engine(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test comparing engines with the reference."""
+    monkeypatch.setitem(ENGINES, "reversed", _ReversedEngine())
+    instances = make_instances(random.Random(0), count=5, size=20)
+    results = compare_engine("fast", instances)
+    assert len(results) == len(instances)
+    with pytest.raises(EngineMismatch):
+        compare_engine("reversed", instances)
+
+
+def test_check_baseline() -> None:
+    """Test detecting performance regressions."""
+    check_baseline({"fast": 1.9, "new": 0.5}, {"fast": 2.0})
+    with pytest.raises(PerformanceRegression):
+        check_baseline({"fast": 1.0}, {"fast": 2.0})
+
+
+def test_measure_peak_memory() -> None:
+    """Test that peak memory of an engine is measured."""
+    instance = differential.random_instance(random.Random(0), 10)
+    assert differential.measure_peak_memory(ENGINES["fast"], instance) > 0
+
+
+def test_compare_coarse(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test checking coarse solutions against their bounds."""
+    instances = make_instances(random.Random(0), count=5, size=20)
+    results = compare_coarse(10, instances)
+    assert len(results) == len(instances)
+    assert all(result.engine == "coarse-10" for result in results)
+
+    def reversed_coarse(
+        polylines: List[Polyline],
+        bucket_width: int,
+        stats: Optional[SolverStats] = None,
+    ) -> List[SolutionStep]:
+        return list(reversed(optimize_x_moves(polylines, stats)))
+
+    monkeypatch.setattr(
+        differential, "optimize_x_moves_coarse", reversed_coarse
+    )
+    with pytest.raises(BoundExceeded):
+        compare_coarse(1, instances)
+
+
+def test_main(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test running the whole harness and storing a baseline."""
+    baseline = tmp_path / "baseline.json"
+    args = ["--instances", "2", "--size", "10", "--baseline", str(baseline)]
+    args += ["--engine", "fast", "--bucket-width", "5"]
+    main(args + ["--update-baseline"])
+    with open(baseline) as baseline_file:
+        assert set(json.load(baseline_file)) == {"coarse-5", "fast"}
+    assert "fast: 11 instances" in capsys.readouterr().out
+
+    with open(baseline, "w") as baseline_file:
+        json.dump({"fast": 1e9}, baseline_file)
+    # The baseline is only checked when asked for.
+    main(args)
+    with pytest.raises(SystemExit):
+        main(args + ["--check-baseline"])
@@ -0,0 +1,77 @@
+"""Tests for engines.py."""
+
+import random
+
+import pytest
+
+from cut_optimizer.algorithms import engines, reference
+from cut_optimizer.algorithms.differential import (
+    check_solution,
+    random_instance,
+    x_travel,
+)
+from cut_optimizer.algorithms.engines import (
+    ENGINES,
+    get_engine,
+    ParallelEngine,
+    select_engine,
+)
+from cut_optimizer.algorithms.optimize_x_moves import SolverStats
+from cut_optimizer.instance import Point, Polyline
+
+
+def test_get_engine(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test getting engines by name."""
+    assert get_engine("fast") is ENGINES["fast"]
+    assert get_engine("auto", []) is ENGINES["fast"]
+    with pytest.raises(KeyError):
+        get_engine("no-such-engine")
+    # The original solver is only an oracle for the differential harness.
+    with pytest.raises(KeyError):
+        get_engine("reference")
+    monkeypatch.setitem(ENGINES, "parallel", ParallelEngine(max_workers=1))
+    with pytest.raises(ValueError):
+        get_engine("parallel")
+
+
+def test_select_engine(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the parallel engine is selected only for big instances."""
+    monkeypatch.setitem(ENGINES, "parallel", ParallelEngine(max_workers=2))
+    monkeypatch.setattr(engines, "PARALLEL_THRESHOLD", 3)
+    small = [Polyline("A", Point(1, 0), Point(5, 0), is_closed=False)]
+    big = small + [Polyline("B", Point(2, 0), Point(9, 0), is_closed=False)]
+    vertical = [
+        Polyline("C", Point(x, 0), Point(x, 1), is_closed=False)
+        for x in range(9)
+    ]
+    assert select_engine(small).name == "fast"
+    assert select_engine(big).name == "parallel"
+    assert select_engine(vertical).name == "fast"
+
+
+def test_parallel_engine() -> None:
+    """Test that the parallel engine finds optimal solutions."""
+    polylines = random_instance(random.Random(0), 30)
+    engine = ParallelEngine(max_workers=2)
+    solution = engine.solve(polylines)
+    check_solution(polylines, solution)
+    assert x_travel(solution) == x_travel(reference.optimize_x_moves(polylines))
+    # Worker processes are reused by later solves.
+    executor = engine._executor
+    assert executor is not None
+    engine.solve(polylines)
+    assert engine._executor is executor
+    engine.shutdown()
+    assert engine._executor is None
+
+
+def test_iter_solve_matches_solve() -> None:
+    """Test that engines generate the same steps as they return."""
+    polylines = random_instance(random.Random(0), 30)
+    parallel = ParallelEngine(max_workers=2)
+    for engine in [ENGINES["fast"], parallel]:
+        stats = SolverStats()
+        steps = engine.iter_solve(polylines, stats, random.Random(0))
+        assert stats.fast_path is None
+        assert list(steps) == engine.solve(polylines, rng=random.Random(0))
+    parallel.shutdown()
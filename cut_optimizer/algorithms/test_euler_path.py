@@ -1,5 +1,8 @@
 """Tests for euler_path.py"""
 
+import sys
+from random import Random
+
 import pytest
 
 from cut_optimizer.algorithms.euler_path import euler_path, NoEulerPathFound
@@ -127,3 +130,31 @@ def test_euler_path_multigraph_2() -> None:
         "DBCA",
         "DCBA",
     }
+
+
+def test_euler_path_long() -> None:
+    """Test finding an Euler path longer than the recursion limit."""
+    graph = LabelledGraph[int, str]()
+    size = 3 * sys.getrecursionlimit()
+    graph.add_tagged_vertices(range(size + 1))
+    for vertex in range(size):
+        graph.add_tagged_edge(vertex, vertex + 1, "E")
+    assert _euler_path_as_string(graph, start=0) == "E" * size
+    with pytest.raises(NoEulerPathFound):
+        _euler_path_as_string(graph, start=1)
+
+
+def test_euler_path_seeded() -> None:
+    """Test that the same seed gives the same path."""
+    graph = LabelledGraph[int, str]()
+    graph.add_tagged_vertices([1, 2])
+    for tag in "ABCDEFG":
+        graph.add_tagged_edge(1, 2, tag)
+    paths = {
+        "".join(
+            graph.get_tag(edge)
+            for edge in euler_path(graph, graph.get_vertex(1), Random(seed))
+        )
+        for seed in [3, 3, 3]
+    }
+    assert len(paths) == 1
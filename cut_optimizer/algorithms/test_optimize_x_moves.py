@@ -1,10 +1,22 @@
 """Tests for optimize_x_moves.py."""
 
-from typing import Sequence
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence
 
+from cut_optimizer.algorithms.clusters import SolutionCache
+from cut_optimizer.algorithms.differential import make_instances, x_travel
 from cut_optimizer.algorithms.optimize_x_moves import (
+    build_graph,
+    iter_optimize_x_moves,
+    open_x_coords,
     optimize_x_moves,
+    place_closed_polylines,
     SolutionStep,
+    solve_with_graph,
+    SolverStats,
+    XCoordGraph,
 )
 from cut_optimizer.instance import Point, Polyline
 
@@ -185,3 +197,169 @@ def test_case_11() -> None:
         Polyline("I", Point(900, 0), Point(950, 300), is_closed=True),
     ]
     assert steps_to_string(optimize_x_moves(polylines)) == "ABCDEFGHI"
+
+
+def test_duplicate_polylines() -> None:
+    """Test that duplicate polylines are cut in alternating directions."""
+    polylines = [
+        Polyline("A", Point(1, 0), Point(5, 0), is_closed=False)
+        for _ in range(5)
+    ] + [Polyline("B", Point(5, 0), Point(9, 0), is_closed=False)]
+    assert (
+        steps_to_string(optimize_x_moves(polylines), show_directions=True)
+        == "AA'AA'AB"
+    )
+
+
+def test_duplicate_polylines_are_bundled() -> None:
+    """Test that polylines between the same coordinates share edges."""
+    graph = XCoordGraph()
+    graph.add_open_polylines(
+        [Polyline("A", Point(1, 0), Point(5, 0), is_closed=False)] * 100
+        + [Polyline("B", Point(5, 0), Point(1, 0), is_closed=False)] * 100
+        + [Polyline("C", Point(7, 0), Point(7, 9), is_closed=False)] * 100
+    )
+    assert len(graph.edges) == 3
+
+
+def test_closed_polylines_are_not_edges() -> None:
+    """Test that closed polylines don't add edges to the graph."""
+    graph = XCoordGraph()
+    graph.add_open_polylines(
+        [Polyline("A", Point(1, 0), Point(5, 0), is_closed=False)]
+    )
+    graph.add_closed_polylines(
+        [Polyline("B", Point(2, 0), Point(6, 3), is_closed=True)] * 10
+    )
+    assert len(graph.edges) == 1
+    assert len(graph.closed_polylines[graph.get_vertex(5)]) == 10
+
+
+def test_closed_polylines_are_rolled_back() -> None:
+    """Test that closed polylines added in a transaction are removed."""
+    graph = XCoordGraph()
+    graph.add_closed_polylines(
+        [Polyline("A", Point(2, 0), Point(6, 3), is_closed=True)]
+    )
+    with graph.transaction():
+        graph.add_closed_polylines(
+            [Polyline("B", Point(2, 0), Point(6, 3), is_closed=True)] * 2
+            + [Polyline("C", Point(7, 0), Point(9, 3), is_closed=True)]
+        )
+    assert graph.closed_polylines == {
+        graph.get_vertex(2): [
+            Polyline("A", Point(2, 0), Point(6, 3), is_closed=True)
+        ]
+    }
+
+
+def test_vertex_x_coords_without_graph() -> None:
+    """Test that X coordinates of vertices are found without the graph."""
+    instances = make_instances(random.Random(2), count=5, size=40)
+    for polylines in instances.values():
+        open_coords = open_x_coords(polylines)
+        closed = [poly for poly in polylines if poly.is_closed]
+        x_coords = set(open_coords)
+        for _polyline, position in place_closed_polylines(open_coords, closed):
+            x_coords.add(position)
+        assert x_coords == set(build_graph(polylines).get_vertex_tags())
+
+
+def test_fast_paths() -> None:
+    """Test that degenerate instances are solved without the graph."""
+    closed = [
+        Polyline("A", Point(4, 0), Point(9, 3), is_closed=True),
+        Polyline("B", Point(1, 0), Point(3, 3), is_closed=True),
+    ]
+    vertical = [
+        Polyline("C", Point(6, 0), Point(6, 9), is_closed=False),
+        Polyline("D", Point(2, 5), Point(2, 1), is_closed=False),
+    ]
+    for polylines, fast_path, expected in [
+        (closed, "closed-only", "BA"),
+        (closed + vertical[:1], "single-x", "BAC"),
+        (closed + vertical, "vertical-only", "BDAC"),
+    ]:
+        stats = SolverStats()
+        solution = optimize_x_moves(polylines, stats)
+        assert stats.fast_path == fast_path
+        assert steps_to_string(solution, show_directions=True) == expected
+        assert x_travel(solution) == x_travel(solve_with_graph(polylines))
+
+    stats = SolverStats()
+    optimize_x_moves(
+        [Polyline("E", Point(1, 0), Point(2, 0), is_closed=False)], stats
+    )
+    assert stats.fast_path is None
+
+
+def test_repeated_clusters() -> None:
+    """Test that solutions of repeated clusters are reused."""
+    tile = [
+        Polyline("A", Point(1, 0), Point(5, 0), is_closed=False),
+        Polyline("B", Point(3, 0), Point(9, 0), is_closed=False),
+        Polyline("C", Point(4, 0), Point(6, 2), is_closed=True),
+    ]
+    polylines = [
+        polyline._replace(
+            start=polyline.start._replace(x=polyline.start.x + offset),
+            end=polyline.end._replace(x=polyline.end.x + offset),
+        )
+        for offset in (0, 20, 40)
+        for polyline in tile
+    ]
+    cache = SolutionCache()
+    stats = SolverStats()
+    solution = optimize_x_moves(polylines, stats, cache)
+    assert stats.clusters == 3
+    assert stats.cached_clusters == 2
+    assert x_travel(solution) == x_travel(solve_with_graph(polylines))
+
+    stats = SolverStats()
+    optimize_x_moves(polylines[3:], stats, cache)
+    assert stats.cached_clusters == 2
+
+
+def test_iter_optimize_x_moves_solves_before_returning() -> None:
+    """Test that steps are generated after the solution is found."""
+    polylines = [
+        Polyline("A", Point(1, 0), Point(5, 0), is_closed=False),
+        Polyline("B", Point(23, 0), Point(29, 0), is_closed=False),
+        Polyline("C", Point(24, 0), Point(26, 2), is_closed=True),
+    ]
+    stats = SolverStats()
+    steps = iter_optimize_x_moves(polylines, stats, rng=random.Random(0))
+    assert stats.clusters == 2
+    assert list(steps) == optimize_x_moves(polylines, rng=random.Random(0))
+
+
+def test_concurrent_solves_match_serial() -> None:
+    """Test that seeded solves in threads give the same results as serial."""
+    instances = list(
+        make_instances(random.Random(0), count=8, size=30).values()
+    )
+
+    def solve(index: int) -> List[SolutionStep]:
+        return optimize_x_moves(instances[index], rng=random.Random(index))
+
+    random_state = random.getstate()
+    recursion_limit = sys.getrecursionlimit()
+    serial = [solve(index) for index in range(len(instances))]
+    with ThreadPoolExecutor(8) as executor:
+        for _ in range(3):
+            assert list(executor.map(solve, range(len(instances)))) == serial
+    assert random.getstate() == random_state
+    assert sys.getrecursionlimit() == recursion_limit
+
+
+def test_penalty_for_end_matches_added_edges() -> None:
+    """Test that penalties of ends are the same as with penalty edges."""
+    instances = make_instances(random.Random(1), count=5, size=30)
+    for polylines in instances.values():
+        graph = build_graph(polylines, random.Random(0))
+        begin = graph.get_vertex(0)
+        for end in list(graph.vertices):
+            with graph.transaction():
+                penalty = graph.add_required_penalties(begin, end)
+                penalty += graph.make_connected()
+            assert graph.penalty_for_end(end) == penalty
@@ -1,32 +1,47 @@
 """CLI for the cut optimizer."""
 
 import argparse
+import random
 import sys
-from typing import List, TextIO
-
-from cut_optimizer.algorithms.optimize_x_moves import optimize_x_moves
-from cut_optimizer.instance import Point, Polyline
-
-
-def read_instance(input_file: TextIO) -> List[Polyline]:
-    """Read CutInstance from an I/O stream."""
-    polylines = []
-    for line in input_file:
-        if not line or line.startswith("#"):
-            continue
-        tokens = line.split()
-        assert len(tokens) == 6
-        poly = Polyline(
-            name=tokens[0],
-            start=Point(int(tokens[2]), int(tokens[3])),
-            end=Point(int(tokens[4]), int(tokens[5])),
-            is_closed={"O": False, "C": True}[tokens[1]],
-        )
-        if poly.is_closed:
-            assert poly.start.x <= poly.end.x
-            assert poly.start.y <= poly.end.y
-        polylines.append(poly)
-    return polylines
+from contextlib import nullcontext
+from typing import ContextManager, Dict, Iterable, List, Optional
+
+from cut_optimizer.algorithms.coarse import optimize_x_moves_coarse
+from cut_optimizer.algorithms.engines import (
+    AUTO_ENGINE,
+    Engine,
+    ENGINES,
+    get_engine,
+    select_engine,
+)
+from cut_optimizer.algorithms.optimize_x_moves import SolutionStep, SolverStats
+from cut_optimizer.external import (
+    DEFAULT_MAX_RECORDS,
+    optimize_x_moves_external,
+)
+from cut_optimizer.instance import (
+    InstanceFormatError,
+    iter_instance,
+    read_instance,
+)
+from cut_optimizer.output import GCodeTemplates, write_gcode, write_text
+from cut_optimizer.parallel_reader import (
+    iter_instance_parallel,
+    read_instance_parallel,
+)
+from cut_optimizer.profiling import phase, profile
+
+
+def parse_template_overrides(overrides: List[str]) -> Dict[str, str]:
+    """Parse `NAME=TEMPLATE` arguments given on the command line."""
+    result = {}
+    for override in overrides:
+        name, separator, template = override.partition("=")
+        if not separator:
+            raise ValueError(f"Expected NAME=TEMPLATE, got: {override}")
+        # Allow multi-line templates to be given in a single argument.
+        result[name] = template.replace("\\n", "\n")
+    return result
 
 
 def main() -> None:
@@ -34,26 +49,162 @@ def main() -> None:
 
     parser = argparse.ArgumentParser("X-move optimizer")
     parser.add_argument("input_file", nargs="?", default="-", help="Input file")
+    parser.add_argument(
+        "--format",
+        choices=["text", "gcode"],
+        default="text",
+        help="Output format",
+    )
+    parser.add_argument(
+        "--gcode-template",
+        action="append",
+        default=[],
+        metavar="NAME=TEMPLATE",
+        help="Override a G-code template (header, rapid, cut_start, "
+        "closed_start, cut_end, footer); '\\n' separates lines",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=[AUTO_ENGINE]
+        + sorted(
+            name for name, engine in ENGINES.items() if engine.is_available()
+        ),
+        default=AUTO_ENGINE,
+        help="Solver engine; 'auto' selects one based on the instance",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print information about solving to standard error",
+    )
+    parser.add_argument(
+        "--external",
+        action="store_true",
+        help="Keep polylines on disk for instances larger than memory; "
+        "--engine is ignored",
+    )
+    parser.add_argument(
+        "--max-records",
+        type=int,
+        default=DEFAULT_MAX_RECORDS,
+        help="Max records, i.e. polylines, not bytes, held in memory at once "
+        "with --external; split between up to three sorters",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Processes used to parse the input file",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed for breaking ties, which makes the output reproducible",
+    )
+    parser.add_argument(
+        "--bucket-width",
+        type=int,
+        default=1,
+        help="Snap X coordinates into buckets of this width to solve faster "
+        "with a bounded amount of extra X travel; --engine is ignored",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PREFIX",
+        help="Write a profile of solving to PREFIX.pstats and a flame graph "
+        "ready one, with stacks labelled by phases, to PREFIX.folded; work "
+        "in worker processes (parallel engine, --jobs) isn't profiled",
+    )
     args = parser.parse_args()
+    if args.max_records <= 0:
+        parser.error("--max-records must be positive")
+    if args.jobs <= 0:
+        parser.error("--jobs must be positive")
+    if args.bucket_width <= 0:
+        parser.error("--bucket-width must be positive")
+    if args.stats and args.external:
+        parser.error("--stats can't be used with --external")
+
+    try:
+        templates = GCodeTemplates.from_overrides(
+            parse_template_overrides(args.gcode_template)
+        )
+    except ValueError as error:
+        parser.error(str(error))
+    # Arguments are checked before profiling starts. The automatic engine
+    # is selected once the instance is read.
+    engine: Optional[Engine] = None
+    if args.engine != AUTO_ENGINE:
+        try:
+            engine = get_engine(args.engine)
+        except ValueError as error:
+            parser.error(str(error))
+
+    def write_steps(steps: Iterable[SolutionStep]) -> None:
+        with phase("output"):
+            if args.format == "gcode":
+                write_gcode(steps, sys.stdout, templates)
+            else:
+                write_text(steps, sys.stdout)
+
+    rng = random.Random(args.seed)
+    profiling: ContextManager[object] = (
+        profile(args.profile) if args.profile else nullcontext()
+    )
+    with profiling:
+        try:
+            if args.external:
+                if args.input_file == "-":
+                    polylines = iter_instance(sys.stdin)
+                else:
+                    polylines = iter_instance_parallel(
+                        args.input_file, args.jobs
+                    )
+                # Polylines are read while the graph is built, and the rest
+                # of the solution is read back from disk while it's written.
+                with phase("solve"):
+                    external_steps = optimize_x_moves_external(
+                        polylines, args.max_records, rng=rng
+                    )
+                write_steps(external_steps)
+                return
+            with phase("read"):
+                if args.input_file == "-":
+                    polys = read_instance(sys.stdin)
+                else:
+                    polys = read_instance_parallel(args.input_file, args.jobs)
+        except InstanceFormatError as error:
+            parser.exit(1, f"{args.input_file}: {error}\n")
 
-    if args.input_file == "-":
-        polys = read_instance(sys.stdin)
-    else:
-        with open(args.input_file, "r") as input_file:
-            polys = read_instance(input_file)
-
-    for step in optimize_x_moves(polys):
-        if step.polyline.is_closed:
-            step_type = "closed "
-        elif step.start == step.polyline.start:
-            step_type = "forward"
+        stats = SolverStats()
+        # Steps are found before writing starts. Engines generate them one
+        # by one while they're written, but coarse solutions are refined as
+        # a whole.
+        steps: Iterable[SolutionStep]
+        if args.bucket_width > 1:
+            engine_name = "coarse"
+            with phase("solve"):
+                steps = optimize_x_moves_coarse(
+                    polys, args.bucket_width, stats, rng
+                )
         else:
-            step_type = "reverse"
-        print(
-            "{} {} {} -> {}".format(
-                step.polyline.name, step_type, step.start, step.end,
+            if engine is None:
+                engine = select_engine(polys)
+            engine_name = engine.name
+            with phase("solve"):
+                steps = engine.iter_solve(polys, stats, rng)
+        if args.stats:
+            print(f"engine: {engine_name}", file=sys.stderr)
+            print(f"fast path: {stats.fast_path or 'none'}", file=sys.stderr)
+            print(
+                f"clusters: {stats.clusters} ({stats.cached_clusters} cached)",
+                file=sys.stderr,
             )
-        )
+            print(
+                f"extra travel bound: {stats.extra_travel_bound}",
+                file=sys.stderr,
+            )
+        write_steps(steps)
 
 
 if __name__ == "__main__":
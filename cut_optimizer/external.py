@@ -0,0 +1,356 @@
+"""Solving instances which don't fit in memory.
+
+Polylines are streamed from the input and spilled to sorted runs on disk, so
+that at most a configurable number of them is held in memory at once. Open
+polylines are sorted by their pairs of X coordinates, and the merged runs are
+turned into bundles whose polylines stay on disk; the graph used to compute
+degree parity and connectivity only has one edge per bundle. Closed polylines
+are spilled together with the X coordinate where they are cut. Those which fit
+between two X coordinates of open polylines are first spilled twice, sorted by
+their left and right ends within each interval, and placed by merging the two
+streams. The solution is generated step by step, reading polylines back from
+disk as needed.
+
+The graph itself is kept in memory, so its size is bounded by the number of
+distinct X coordinates and pairs of them rather than by the number of
+polylines.
+"""
+
+import heapq
+import os
+import random
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    overload,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from cut_optimizer.algorithms.optimize_x_moves import (
+    closed_polyline_position,
+    place_closed_polylines_between,
+    SolutionStep,
+    XCoordGraph,
+)
+from cut_optimizer.graph import Edge, Vertex
+from cut_optimizer.instance import (
+    format_polyline,
+    iter_instance,
+    parse_polyline,
+    Polyline,
+)
+from cut_optimizer.profiling import iter_phase, phase
+
+DEFAULT_MAX_RECORDS = 1_000_000
+
+# A record to be sorted: integer key and a polyline formatted as a line.
+Record = Tuple[Tuple[int, ...], str]
+
+
+class ExternalSorter:
+    """Sorts records which don't fit in memory using sorted runs on disk.
+
+    At most `max_records` records are kept in memory. When there are more of
+    them, they are sorted and written to a new run file in `tmp_dir`.
+    """
+
+    def __init__(self, tmp_dir: str, max_records: int) -> None:
+        assert max_records > 0
+        self.tmp_dir = tmp_dir
+        self.max_records = max_records
+        self.buffer: List[Record] = []
+        self.runs: List[str] = []
+
+    def add(self, key: Tuple[int, ...], line: str) -> None:
+        """Add a record, spilling the buffered ones to disk if it's full."""
+        self.buffer.append((key, line))
+        if len(self.buffer) >= self.max_records:
+            self._spill()
+
+    def merged(self) -> Iterator[Record]:
+        """Return all records sorted by their keys.
+
+        Records with equal keys are returned in the order they were added.
+        """
+        self.buffer.sort(key=itemgetter(0))
+        streams = [self._read_run(path) for path in self.runs]
+        return heapq.merge(*streams, iter(self.buffer), key=itemgetter(0))
+
+    def _spill(self) -> None:
+        self.buffer.sort(key=itemgetter(0))
+        run_fd, path = tempfile.mkstemp(suffix=".run", dir=self.tmp_dir)
+        with open(run_fd, "w") as run_file:
+            for key, line in self.buffer:
+                run_file.write(" ".join(map(str, key)) + "\t" + line + "\n")
+        self.runs.append(path)
+        self.buffer = []
+
+    @staticmethod
+    def _read_run(path: str) -> Iterator[Record]:
+        with open(path, "r") as run_file:
+            for run_line in run_file:
+                key, _separator, line = run_line.rstrip("\n").partition("\t")
+                yield tuple(int(value) for value in key.split()), line
+
+
+class _PolylineWriter:
+    """Append-only file of polylines, one per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file: BinaryIO = open(path, "wb")
+
+    def write(self, line: str) -> int:
+        """Write a formatted polyline.
+
+        :return: offset of the line in the file.
+        """
+        offset = self.file.tell()
+        self.file.write(line.encode() + b"\n")
+        return offset
+
+    def close(self) -> None:
+        """Close the file so that it can be read."""
+        self.file.close()
+
+
+class SpilledPolylines(Sequence[Polyline]):
+    """Polylines stored on consecutive lines of a file and read on demand.
+
+    Polylines are read again on each iteration, so it's best to iterate
+    only once. Indexing reads all the polylines.
+    """
+
+    def __init__(self, path: str, offset: int, length: int) -> None:
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Polyline]:
+        with open(self.path, "rb") as polyline_file:
+            polyline_file.seek(self.offset)
+            for _ in range(self.length):
+                polyline = parse_polyline(polyline_file.readline().decode())
+                assert polyline is not None
+                yield polyline
+
+    @overload
+    def __getitem__(self, index: int) -> Polyline:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[Polyline]:
+        ...
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[Polyline, Sequence[Polyline]]:
+        return list(self)[index]
+
+
+class ExternalXCoordGraph(XCoordGraph):
+    """XCoordGraph which keeps polylines on disk instead of in memory.
+
+    Files are created in `tmp_dir`, which must exist as long as the graph is
+    used. While closed polylines are added, three sorters are filled at once,
+    so each of them holds at most a third of `max_records`.
+    """
+
+    def __init__(
+        self,
+        tmp_dir: str,
+        max_records: int,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        super().__init__(rng)
+        self.tmp_dir = tmp_dir
+        self.max_sorter_records = max(1, max_records // 3)
+        self.closed_sorter = ExternalSorter(tmp_dir, self.max_sorter_records)
+        self.closed_index: Dict[Vertex, SpilledPolylines] = {}
+
+    def add_sorted_open_polylines(self, records: Iterable[Record]) -> None:
+        """Add open polylines from records sorted by their X coordinates.
+
+        The key of each record must be the pair of the minimal and maximal X
+        coordinate of the polyline.
+        """
+        path = os.path.join(self.tmp_dir, "open")
+        writer = _PolylineWriter(path)
+        for (x_1, x_2), group in groupby(records, key=itemgetter(0)):
+            first_offset = last_offset = -1
+            count = 0
+            for _key, line in group:
+                last_offset = writer.write(line)
+                if count == 0:
+                    first_offset = last_offset
+                count += 1
+            if x_1 != x_2 and count % 2 == 0:
+                # See `add_open_polylines` for why even bundles are split.
+                self.add_polyline_bundle(
+                    x_1, x_2, SpilledPolylines(path, first_offset, count - 1)
+                )
+                self.add_polyline_bundle(
+                    x_1, x_2, SpilledPolylines(path, last_offset, 1)
+                )
+            else:
+                self.add_polyline_bundle(
+                    x_1, x_2, SpilledPolylines(path, first_offset, count)
+                )
+        writer.close()
+
+    def add_closed_polylines(self, polylines: Iterable[Polyline]) -> None:
+        """Spill closed polylines with positions where they will be cut.
+
+        This can be called only after all open polylines are already added.
+        """
+        x_coords = self.coordinate_index().x_coords
+        # Polylines between two X coordinates sorted by their left ends and
+        # by their right ends in reverse, numbered to tell them apart.
+        by_start = ExternalSorter(self.tmp_dir, self.max_sorter_records)
+        by_end = ExternalSorter(self.tmp_dir, self.max_sorter_records)
+        for number, polyline in enumerate(polylines):
+            position = closed_polyline_position(x_coords, polyline)
+            if isinstance(position, int):
+                self.add_closed_polyline_at(polyline, position)
+            else:
+                line = format_polyline(polyline)
+                by_start.add((*position, polyline.start.x, number), line)
+                by_end.add((*position, -polyline.end.x, number), line)
+        intervals = zip(
+            groupby(by_start.merged(), key=_interval),
+            groupby(by_end.merged(), key=_interval),
+        )
+        for (interval, start_group), (end_interval, end_group) in intervals:
+            assert interval == end_interval
+            for polyline, position in place_closed_polylines_between(
+                _numbered_polylines(start_group),
+                _numbered_polylines(end_group),
+                *interval,
+            ):
+                self.add_closed_polyline_at(polyline, position)
+
+    def add_closed_polyline_at(self, polyline: Polyline, position: int) -> None:
+        """Spill one closed polyline to be cut at a given position.
+
+        `index_closed_polylines` must be called after all closed polylines
+        are added.
+        """
+        assert polyline.start.x <= position <= polyline.end.x
+        self._ensure_vertex(position)
+        self.closed_sorter.add((position,), format_polyline(polyline))
+
+    def index_closed_polylines(self) -> None:
+        """Sort spilled closed polylines by their positions."""
+        writer = _PolylineWriter(os.path.join(self.tmp_dir, "closed"))
+        for (position,), group in groupby(
+            self.closed_sorter.merged(), key=itemgetter(0)
+        ):
+            first_offset = -1
+            count = 0
+            for _key, line in group:
+                offset = writer.write(line)
+                if count == 0:
+                    first_offset = offset
+                count += 1
+            self.closed_index[self.get_vertex(position)] = SpilledPolylines(
+                writer.path, first_offset, count
+            )
+        writer.close()
+
+    def closed_polylines_at(self, vertex: Vertex) -> Sequence[Polyline]:
+        """Return closed polylines which are cut at a given vertex."""
+        return self.closed_index.get(vertex, ())
+
+
+def _interval(record: Record) -> Tuple[int, ...]:
+    """Return the interval of a closed polyline spilled by its ends."""
+    return record[0][:2]
+
+
+def _numbered_polylines(
+    records: Iterable[Record],
+) -> Iterator[Tuple[int, Polyline]]:
+    """Parse closed polylines spilled by their ends with their numbers."""
+    for key, line in records:
+        polyline = parse_polyline(line)
+        assert polyline is not None
+        yield key[-1], polyline
+
+
+def optimize_x_moves_external(
+    polylines: Iterable[Polyline],
+    max_records: int = DEFAULT_MAX_RECORDS,
+    tmp_dir: Optional[str] = None,
+    rng: Optional[random.Random] = None,
+) -> Iterator[SolutionStep]:
+    """Find an order of cutting for polylines given one by one.
+
+    At most about `max_records` polylines are held in memory at once, the
+    rest is spilled to a temporary directory created in `tmp_dir`. The graph
+    is built and the best path is found before returning. Steps are then
+    generated one by one, so they can be written out while the rest of the
+    solution is read back from disk, and the directory is removed once all
+    of them are generated. Ties are broken using `rng`.
+    """
+    work_dir = tempfile.TemporaryDirectory(dir=tmp_dir)
+    try:
+        with phase("graph build"):
+            graph = _build_external_graph(
+                polylines, work_dir.name, max_records, rng
+            )
+        path = graph.find_best_path()
+    except BaseException:
+        work_dir.cleanup()
+        raise
+    return _iter_external_solution(work_dir, graph, path)
+
+
+def _build_external_graph(
+    polylines: Iterable[Polyline],
+    work_dir: str,
+    max_records: int,
+    rng: Optional[random.Random],
+) -> ExternalXCoordGraph:
+    """Spill polylines to `work_dir` and build a graph representing them."""
+    graph = ExternalXCoordGraph(work_dir, max_records, rng)
+    open_sorter = ExternalSorter(work_dir, max_records)
+    closed_path = os.path.join(work_dir, "input-closed")
+    with open(closed_path, "w") as closed_file:
+        for polyline in polylines:
+            line = format_polyline(polyline)
+            if polyline.is_closed:
+                closed_file.write(line + "\n")
+            else:
+                x_coords = (
+                    min(polyline.start.x, polyline.end.x),
+                    max(polyline.start.x, polyline.end.x),
+                )
+                open_sorter.add(x_coords, line)
+    # All open polylines must be added before closed ones.
+    graph.add_sorted_open_polylines(open_sorter.merged())
+    with open(closed_path, "r") as closed_file:
+        graph.add_closed_polylines(iter_instance(closed_file))
+    graph.index_closed_polylines()
+    return graph
+
+
+def _iter_external_solution(
+    work_dir: "tempfile.TemporaryDirectory[str]",
+    graph: ExternalXCoordGraph,
+    path: List[Edge],
+) -> Iterator[SolutionStep]:
+    """Generate steps of a solution and remove `work_dir` afterwards."""
+    with work_dir:
+        yield from iter_phase("solution", graph.iter_solution(path))
@@ -1,6 +1,18 @@
 """Generic representation of a graph."""
 
-from typing import Dict, Iterable, Set
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    MutableSet,
+    Optional,
+    Set,
+)
 
 from multiset import Multiset
 
@@ -30,8 +42,14 @@ class Graph:
     """Undirected graph."""
 
     def __init__(self) -> None:
-        self.edges: Set[Edge] = set()
-        self.neighbors: Dict[Vertex, "Multiset[Edge]"] = {}
+        self.edges: MutableSet[Edge] = set()
+        self.neighbors: MutableMapping[Vertex, "Multiset[Edge]"] = {}
+        # Functions which undo mutations done since the oldest checkpoint
+        # which is still active. `None` when there are no checkpoints, so
+        # that mutations outside of transactions don't pay for logging.
+        self._undo_log: Optional[List[Callable[[], None]]] = None
+        # Lengths of the undo log at each active checkpoint.
+        self._checkpoints: List[int] = []
 
     @property
     def vertices(self) -> Iterable[Vertex]:
@@ -51,6 +69,7 @@ class Graph:
         """Add a new vertex to the graph."""
         assert vertex not in self.neighbors
         self.neighbors[vertex] = Multiset()
+        self._log_undo(lambda: self._unlink_vertex(vertex))
         return vertex
 
     def add_edge(self, edge: Edge) -> Edge:
@@ -58,16 +77,14 @@ class Graph:
         assert edge not in self.edges
         assert edge.vertex_1 in self.neighbors
         assert edge.vertex_2 in self.neighbors
-        self.neighbors[edge.vertex_1].add(edge, multiplicity=1)
-        self.neighbors[edge.vertex_2].add(edge, multiplicity=1)
-        self.edges.add(edge)
+        self._link_edge(edge)
+        self._log_undo(lambda: self._unlink_edge(edge))
         return edge
 
     def remove_edge(self, edge: Edge) -> None:
         """Remove an edge form the graph."""
-        self.neighbors[edge.vertex_1].remove(edge, multiplicity=1)
-        self.neighbors[edge.vertex_2].remove(edge, multiplicity=1)
-        self.edges.remove(edge)
+        self._unlink_edge(edge)
+        self._log_undo(lambda: self._link_edge(edge))
 
     def get_vertex_degree(self, vertex: Vertex) -> int:
         """Get a degree of a given vertex."""
@@ -76,3 +93,171 @@ class Graph:
     def is_even_degree(self, vertex: Vertex) -> bool:
         """Tell if the degree of a given vertex is even."""
         return self.get_vertex_degree(vertex) % 2 == 0
+
+    def checkpoint(self) -> int:
+        """Start logging mutations so that they can be rolled back.
+
+        :return: an identifier of the checkpoint to pass to `rollback`.
+        """
+        if self._undo_log is None:
+            self._undo_log = []
+        self._checkpoints.append(len(self._undo_log))
+        return len(self._checkpoints) - 1
+
+    def rollback(self, checkpoint: int) -> None:
+        """Undo all mutations done since the given checkpoint.
+
+        This takes time proportional to the number of undone mutations. The
+        checkpoint and all checkpoints created after it become invalid.
+        """
+        undo_log = self._undo_log
+        assert undo_log is not None and checkpoint < len(self._checkpoints)
+        log_length = self._checkpoints[checkpoint]
+        del self._checkpoints[checkpoint:]
+        # Undo functions must not be logged themselves.
+        self._undo_log = None
+        while len(undo_log) > log_length:
+            undo_log.pop()()
+        self._undo_log = undo_log if self._checkpoints else None
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Context manager which undoes all mutations done within it.
+
+        Transactions can be nested. Rolling back is done also when the block
+        is left because of an exception.
+        """
+        checkpoint = self.checkpoint()
+        try:
+            yield
+        finally:
+            self.rollback(checkpoint)
+
+    def _log_undo(self, undo: Callable[[], None]) -> None:
+        """Remember how to undo a mutation if there's an active checkpoint."""
+        if self._undo_log is not None:
+            self._undo_log.append(undo)
+
+    def _unlink_vertex(self, vertex: Vertex) -> None:
+        assert not self.neighbors[vertex]
+        del self.neighbors[vertex]
+
+    def _link_edge(self, edge: Edge) -> None:
+        self.neighbors[edge.vertex_1].add(edge, multiplicity=1)
+        self.neighbors[edge.vertex_2].add(edge, multiplicity=1)
+        self.edges.add(edge)
+
+    def _unlink_edge(self, edge: Edge) -> None:
+        self.neighbors[edge.vertex_1].remove(edge, multiplicity=1)
+        self.neighbors[edge.vertex_2].remove(edge, multiplicity=1)
+        self.edges.remove(edge)
+
+
+class GraphView(Graph):
+    """Copy-on-write view of another graph.
+
+    The view starts with the same vertices and edges as the base graph and
+    can be modified without affecting the base graph. Only the changes and
+    the adjacency of vertices which were accessed are stored in the view, so
+    creating it takes constant time regardless of the size of the base graph.
+    The base graph must not be modified while the view is in use.
+    """
+
+    def __init__(self, base: Graph) -> None:
+        super().__init__()
+        self.base = base
+        self.edges = _OverlaySet(base.edges)
+        self.neighbors = _CopyOnWriteNeighbors(base.neighbors)
+
+
+class _OverlaySet(MutableSet[Edge]):
+    """A set of edges stored as differences from some base set."""
+
+    def __init__(self, base: MutableSet[Edge]) -> None:
+        self.base = base
+        self.added: Set[Edge] = set()
+        self.removed: Set[Edge] = set()
+
+    def __contains__(self, edge: object) -> bool:
+        return edge in self.added or (
+            edge in self.base and edge not in self.removed
+        )
+
+    def __iter__(self) -> Iterator[Edge]:
+        for edge in self.base:
+            if edge not in self.removed:
+                yield edge
+        yield from self.added
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.removed) + len(self.added)
+
+    def add(self, edge: Edge) -> None:
+        if edge in self.base:
+            self.removed.discard(edge)
+        else:
+            self.added.add(edge)
+
+    def discard(self, edge: Edge) -> None:
+        if edge in self.base:
+            self.removed.add(edge)
+        else:
+            self.added.discard(edge)
+
+
+class _CopyOnWriteNeighbors(MutableMapping[Vertex, "Multiset[Edge]"]):
+    """Adjacency which copies neighbors from some base on the first access.
+
+    Values of the mapping are mutable, so they have to be copied when they
+    are read and not only when they are assigned.
+    """
+
+    def __init__(self, base: MutableMapping[Vertex, "Multiset[Edge]"]) -> None:
+        self.base: Mapping[Vertex, "Multiset[Edge]"] = base
+        self.copied: Dict[Vertex, "Multiset[Edge]"] = {}
+        self.removed: Set[Vertex] = set()
+        # Number of copied vertices which don't exist in the base.
+        self.num_added = 0
+
+    def __contains__(self, vertex: object) -> bool:
+        return vertex in self.copied or (
+            vertex in self.base and vertex not in self.removed
+        )
+
+    def __getitem__(self, vertex: Vertex) -> "Multiset[Edge]":
+        try:
+            return self.copied[vertex]
+        except KeyError:
+            if vertex in self.removed:
+                raise
+        neighbors: "Multiset[Edge]" = Multiset(self.base[vertex])
+        self.copied[vertex] = neighbors
+        return neighbors
+
+    def __setitem__(self, vertex: Vertex, neighbors: "Multiset[Edge]") -> None:
+        if vertex not in self:
+            if vertex in self.base:
+                self.removed.remove(vertex)
+            else:
+                self.num_added += 1
+        self.copied[vertex] = neighbors
+
+    def __delitem__(self, vertex: Vertex) -> None:
+        if vertex not in self:
+            raise KeyError(vertex)
+        self.copied.pop(vertex, None)
+        if vertex in self.base:
+            self.removed.add(vertex)
+        else:
+            self.num_added -= 1
+
+    def __iter__(self) -> Iterator[Vertex]:
+        for vertex in self.base:
+            if vertex not in self.removed:
+                yield vertex
+        for vertex in self.copied:
+            if vertex not in self.base:
+                yield vertex
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.removed) + self.num_added
@@ -1,6 +1,9 @@
 """Representation of cutting problems."""
 
-from typing import NamedTuple
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+# Coordinates must be non-negative and fit in 64-bit integers.
+MAX_COORDINATE = 2 ** 63 - 1
 
 
 class Point(NamedTuple):
@@ -38,3 +41,87 @@ class Polyline(NamedTuple):
             self.end,
             "closed" if self.is_closed else "open",
         )
+
+
+class InstanceFormatError(ValueError):
+    """Raised when a line of an instance can't be parsed."""
+
+    def __init__(self, reason: str, line_number: Optional[int] = None) -> None:
+        super().__init__(reason, line_number)
+        self.reason = reason
+        self.line_number = line_number
+
+    def __str__(self) -> str:
+        if self.line_number is None:
+            return self.reason
+        return f"line {self.line_number}: {self.reason}"
+
+    def at_line(self, line_number: int) -> "InstanceFormatError":
+        """Return the same error reported at a given line."""
+        return InstanceFormatError(self.reason, line_number)
+
+
+def parse_polyline(line: str) -> Optional[Polyline]:
+    """Parse a single line of an instance.
+
+    :return: the polyline or `None` if the line is a comment.
+    :raises InstanceFormatError: if the line is invalid.
+    """
+    if not line or line.startswith("#"):
+        return None
+    tokens = line.split()
+    if len(tokens) != 6:
+        raise InstanceFormatError(f"expected 6 fields, got {len(tokens)}")
+    if tokens[1] not in ("O", "C"):
+        raise InstanceFormatError(f"invalid polyline type: {tokens[1]}")
+    try:
+        coords = [int(token) for token in tokens[2:]]
+    except ValueError as error:
+        raise InstanceFormatError(str(error)) from None
+    if any(not 0 <= coord <= MAX_COORDINATE for coord in coords):
+        raise InstanceFormatError("coordinate out of range")
+    poly = Polyline(
+        name=tokens[0],
+        start=Point(coords[0], coords[1]),
+        end=Point(coords[2], coords[3]),
+        is_closed=tokens[1] == "C",
+    )
+    if poly.is_closed and (
+        poly.start.x > poly.end.x or poly.start.y > poly.end.y
+    ):
+        raise InstanceFormatError("invalid bounding box of closed polyline")
+    return poly
+
+
+def format_polyline(polyline: Polyline) -> str:
+    """Format a polyline as a line of an instance, without a newline."""
+    return "{} {} {} {} {} {}".format(
+        polyline.name,
+        "C" if polyline.is_closed else "O",
+        polyline.start.x,
+        polyline.start.y,
+        polyline.end.x,
+        polyline.end.y,
+    )
+
+
+def iter_instance(input_file: Iterable[str]) -> Iterator[Polyline]:
+    """Read polylines from an I/O stream one by one.
+
+    :raises InstanceFormatError: if any line is invalid.
+    """
+    for line_number, line in enumerate(input_file, start=1):
+        try:
+            poly = parse_polyline(line)
+        except InstanceFormatError as error:
+            raise error.at_line(line_number) from None
+        if poly is not None:
+            yield poly
+
+
+def read_instance(input_file: Iterable[str]) -> List[Polyline]:
+    """Read CutInstance from an I/O stream.
+
+    :raises InstanceFormatError: if any line is invalid.
+    """
+    return list(iter_instance(input_file))
@@ -43,20 +43,14 @@ class LabelledGraph(Graph, Generic[_VertexTag, _EdgeTag]):
             # The edge didn't have any tag which is OK
             pass
         else:
-            del self.edge_tags[edge]
-            edges_with_tag = self.tag_to_edges[tag]
-            edges_with_tag.remove(edge)
-            if not edges_with_tag:
-                del self.tag_to_edges[tag]
+            self._untag_edge(edge)
+            self._log_undo(lambda: self._tag_edge(edge, tag))
 
     def add_tagged_vertex(self, tag: _VertexTag) -> Vertex:
         """Add single vertex with a given tag."""
         vertex = super().add_vertex(Vertex())
-        self.vertex_tags[vertex] = tag
-        if tag in self.tag_to_vertices:
-            self.tag_to_vertices[tag].add(vertex)
-        else:
-            self.tag_to_vertices[tag] = {vertex}
+        self._tag_vertex(vertex, tag)
+        self._log_undo(lambda: self._untag_vertex(vertex))
         return vertex
 
     def add_tagged_vertices(self, tags: Sequence[_VertexTag]) -> None:
@@ -81,11 +75,8 @@ class LabelledGraph(Graph, Generic[_VertexTag, _EdgeTag]):
             vertex_2 = self.get_vertex(vertex_2)
         edge = self.add_edge(Edge(vertex_1, vertex_2))
         if not isinstance(tag, _NoArgument):
-            self.edge_tags[edge] = tag
-            if tag in self.tag_to_edges:
-                self.tag_to_edges[tag].add(edge)
-            else:
-                self.tag_to_edges[tag] = {edge}
+            self._tag_edge(edge, tag)
+            self._log_undo(lambda: self._untag_edge(edge))
         return edge
 
     @overload
@@ -134,3 +125,31 @@ class LabelledGraph(Graph, Generic[_VertexTag, _EdgeTag]):
             return next(iter(candidates))
         else:
             raise ValueError(tag)
+
+    def _tag_vertex(self, vertex: Vertex, tag: _VertexTag) -> None:
+        self.vertex_tags[vertex] = tag
+        if tag in self.tag_to_vertices:
+            self.tag_to_vertices[tag].add(vertex)
+        else:
+            self.tag_to_vertices[tag] = {vertex}
+
+    def _untag_vertex(self, vertex: Vertex) -> None:
+        tag = self.vertex_tags.pop(vertex)
+        vertices_with_tag = self.tag_to_vertices[tag]
+        vertices_with_tag.remove(vertex)
+        if not vertices_with_tag:
+            del self.tag_to_vertices[tag]
+
+    def _tag_edge(self, edge: Edge, tag: _EdgeTag) -> None:
+        self.edge_tags[edge] = tag
+        if tag in self.tag_to_edges:
+            self.tag_to_edges[tag].add(edge)
+        else:
+            self.tag_to_edges[tag] = {edge}
+
+    def _untag_edge(self, edge: Edge) -> None:
+        tag = self.edge_tags.pop(edge)
+        edges_with_tag = self.tag_to_edges[tag]
+        edges_with_tag.remove(edge)
+        if not edges_with_tag:
+            del self.tag_to_edges[tag]
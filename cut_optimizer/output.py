@@ -0,0 +1,114 @@
+"""Writing solutions in various output formats."""
+
+from dataclasses import dataclass, fields
+from typing import Dict, Iterable, TextIO
+
+from cut_optimizer.algorithms.optimize_x_moves import SolutionStep
+
+
+def step_direction(step: SolutionStep) -> str:
+    """Tell in which direction a polyline is cut in a given step."""
+    if step.polyline.is_closed:
+        return "closed"
+    elif step.start == step.polyline.start:
+        return "forward"
+    else:
+        return "reverse"
+
+
+def write_text(steps: Iterable[SolutionStep], output: TextIO) -> None:
+    """Write steps as human readable text, one step per line."""
+    for step in steps:
+        output.write(
+            "{} {:7} {} -> {}\n".format(
+                step.polyline.name, step_direction(step), step.start, step.end,
+            )
+        )
+
+
+@dataclass(frozen=True)
+class GCodeTemplates:
+    """Templates of G-code blocks emitted for parts of a machine program.
+
+    Templates are formatted with `str.format` and may use the following
+    fields of the current step: `name`, `direction`, `start_x`, `start_y`,
+    `end_x` and `end_y`. `header` and `footer` are not formatted. Empty
+    templates are skipped.
+    """
+
+    header: str = "G21\nG90"
+    rapid: str = "G0 X{start_x} Y{start_y}"
+    cut_start: str = "M3 ; {name} {direction}"
+    closed_start: str = "M3 ; {name} closed"
+    cut_end: str = "G1 X{end_x} Y{end_y}\nM5"
+    footer: str = "M2"
+
+    @classmethod
+    def from_overrides(cls, overrides: Dict[str, str]) -> "GCodeTemplates":
+        """Create templates with some of the defaults replaced.
+
+        :raises ValueError: if there's no template with a given name or if
+            a template can't be formatted, for example because it uses an
+            unknown field or attribute, or an invalid format spec.
+        """
+        names = {field.name for field in fields(cls)}
+        for name, template in overrides.items():
+            if name not in names:
+                raise ValueError(f"Unknown G-code template: {name}")
+            if name in ("header", "footer"):
+                continue
+            try:
+                template.format(**_EXAMPLE_FIELDS)
+            except (KeyError, IndexError, AttributeError, ValueError) as error:
+                raise ValueError(
+                    f"Invalid G-code template {name}: {error!r}"
+                ) from error
+        return cls(**overrides)
+
+
+_EXAMPLE_FIELDS = {
+    "name": "",
+    "direction": "",
+    "start_x": 0,
+    "start_y": 0,
+    "end_x": 0,
+    "end_y": 0,
+}
+
+
+def write_gcode(
+    steps: Iterable[SolutionStep],
+    output: TextIO,
+    templates: GCodeTemplates = GCodeTemplates(),
+) -> None:
+    """Write steps as a G-code program.
+
+    Steps are written as soon as they are produced by `steps`, so the program
+    can be streamed to a controller while the rest is still being computed.
+    """
+
+    def emit(template: str, step: SolutionStep) -> None:
+        if template:
+            output.write(
+                template.format(
+                    name=step.polyline.name,
+                    direction=step_direction(step),
+                    start_x=step.start.x,
+                    start_y=step.start.y,
+                    end_x=step.end.x,
+                    end_y=step.end.y,
+                )
+                + "\n"
+            )
+
+    if templates.header:
+        output.write(templates.header + "\n")
+    for step in steps:
+        emit(templates.rapid, step)
+        if step.polyline.is_closed:
+            emit(templates.closed_start, step)
+        else:
+            emit(templates.cut_start, step)
+        emit(templates.cut_end, step)
+    if templates.footer:
+        output.write(templates.footer + "\n")
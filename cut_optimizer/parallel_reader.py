@@ -0,0 +1,182 @@
+"""Parsing large instance files in parallel.
+
+The file is memory-mapped and split into chunks at newline boundaries. Each
+chunk is parsed by a worker process into columns of polyline attributes,
+which are much cheaper to send back to the main process than polylines
+themselves. Chunks are processed in order, so the result is the same as if
+the file was parsed sequentially, and errors are reported with line numbers
+counted from the beginning of the file.
+"""
+
+import io
+import mmap
+import os
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Tuple, Union
+
+from cut_optimizer.instance import (
+    InstanceFormatError,
+    iter_instance,
+    Point,
+    Polyline,
+    read_instance,
+)
+
+DEFAULT_CHUNK_SIZE = 16 * 2 ** 20
+
+
+class PolylineColumns:
+    """Polylines stored as columns of their attributes."""
+
+    def __init__(self, polylines: Iterable[Polyline] = ()) -> None:
+        self.names: List[str] = []
+        self.is_closed: "array[int]" = array("b")
+        self.start_x: "array[int]" = array("q")
+        self.start_y: "array[int]" = array("q")
+        self.end_x: "array[int]" = array("q")
+        self.end_y: "array[int]" = array("q")
+        for polyline in polylines:
+            self.append(polyline)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def append(self, polyline: Polyline) -> None:
+        """Add a polyline at the end."""
+        self.names.append(polyline.name)
+        self.is_closed.append(polyline.is_closed)
+        self.start_x.append(polyline.start.x)
+        self.start_y.append(polyline.start.y)
+        self.end_x.append(polyline.end.x)
+        self.end_y.append(polyline.end.y)
+
+    def extend(self, other: "PolylineColumns") -> None:
+        """Add all polylines of other columns at the end."""
+        self.names.extend(other.names)
+        self.is_closed.extend(other.is_closed)
+        self.start_x.extend(other.start_x)
+        self.start_y.extend(other.start_y)
+        self.end_x.extend(other.end_x)
+        self.end_y.extend(other.end_y)
+
+    def polylines(self) -> Iterator[Polyline]:
+        """Create polylines from the columns."""
+        for row in zip(
+            self.names,
+            self.is_closed,
+            self.start_x,
+            self.start_y,
+            self.end_x,
+            self.end_y,
+        ):
+            name, is_closed, start_x, start_y, end_x, end_y = row
+            yield Polyline(
+                name,
+                Point(start_x, start_y),
+                Point(end_x, end_y),
+                bool(is_closed),
+            )
+
+
+def split_into_chunks(
+    data: Union[bytes, mmap.mmap], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> List[Tuple[int, int]]:
+    """Split data into chunks of about `chunk_size` bytes at newlines.
+
+    :return: start and end offsets of the chunks.
+    """
+    assert chunk_size > 0
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = data.find(b"\n", start + chunk_size - 1)
+        end = len(data) if end == -1 else end + 1
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def iter_columns(
+    path: str, jobs: int, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[PolylineColumns]:
+    """Parse chunks of a file in `jobs` processes.
+
+    Columns of chunks are generated in order. Only a few chunks more than
+    `jobs` are parsed ahead of the consumer.
+
+    :raises InstanceFormatError: if any line is invalid.
+    """
+    with open(path, "rb") as input_file:
+        if os.fstat(input_file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            chunks = split_into_chunks(data, chunk_size)
+    with ProcessPoolExecutor(jobs) as executor:
+        pending: Deque["Future[Tuple[PolylineColumns, int]]"] = deque()
+        next_chunk = 0
+        line_offset = 0
+        while pending or next_chunk < len(chunks):
+            while next_chunk < len(chunks) and len(pending) < 2 * jobs:
+                start, end = chunks[next_chunk]
+                pending.append(executor.submit(_parse_chunk, path, start, end))
+                next_chunk += 1
+            try:
+                columns, num_lines = pending.popleft().result()
+            except InstanceFormatError as error:
+                assert error.line_number is not None
+                for future in pending:
+                    future.cancel()
+                raise error.at_line(line_offset + error.line_number) from None
+            line_offset += num_lines
+            yield columns
+
+
+def iter_instance_parallel(
+    path: str, jobs: int, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Polyline]:
+    """Read polylines from a file one by one, parsing it in `jobs` processes.
+
+    :raises InstanceFormatError: if any line is invalid.
+    """
+    if jobs <= 1:
+        with open(path, "r") as input_file:
+            yield from iter_instance(input_file)
+        return
+    for columns in iter_columns(path, jobs, chunk_size):
+        yield from columns.polylines()
+
+
+def read_instance_parallel(
+    path: str, jobs: int, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> List[Polyline]:
+    """Read CutInstance from a file, parsing it in `jobs` processes.
+
+    The result is the same as of `read_instance`.
+
+    :raises InstanceFormatError: if any line is invalid.
+    """
+    if jobs <= 1:
+        with open(path, "r") as input_file:
+            return read_instance(input_file)
+    all_columns = PolylineColumns()
+    for columns in iter_columns(path, jobs, chunk_size):
+        all_columns.extend(columns)
+    return list(all_columns.polylines())
+
+
+def _parse_chunk(
+    path: str, start: int, end: int
+) -> Tuple[PolylineColumns, int]:
+    """Parse a chunk of a file.
+
+    :return: columns of polylines and the number of lines in the chunk.
+    :raises InstanceFormatError: with a line number relative to the chunk.
+    """
+    with open(path, "rb") as input_file:
+        with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            chunk = data[start:end]
+    # Decode and split lines the same way as `open` does in text mode.
+    lines = list(io.TextIOWrapper(io.BytesIO(chunk)))
+    return PolylineColumns(iter_instance(lines)), len(lines)
@@ -0,0 +1,181 @@
+"""Profiling of the solver labelled by its phases.
+
+Code marks phases of solving with `phase`, which does nothing unless a
+profile is being collected with `profile`. While profiling, two profiles are
+collected at once:
+
+* a deterministic profile of the calling thread by `cProfile`, written as a
+  `.pstats` file which can be read with `pstats` or tools like snakeviz,
+* a sampling profile of all threads, written as a `.folded` file with one
+  collapsed stack per line, which can be turned into a flame graph with
+  `flamegraph.pl` or loaded into speedscope.
+
+In collapsed stacks, the name of each phase, in square brackets, follows the
+frame which entered it, so time spent in helpers like `LabelledGraph` or
+`DisjointSet` is attributed to the phase which called them. Only one profile
+can be collected at a time.
+
+Only the current process is profiled. Work done by worker processes, like
+scoring path ends in the parallel engine or parsing chunks of the input
+with several jobs, is missing from both profiles; only the time spent
+waiting for the workers is included.
+"""
+
+import cProfile
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from types import FrameType, TracebackType
+from typing import (
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+# Seconds between samples. Threads which don't release the GIL may be
+# sampled less often.
+DEFAULT_SAMPLING_INTERVAL = 0.001
+
+_NO_PHASE: ContextManager[None] = nullcontext()
+
+_Item = TypeVar("_Item")
+
+
+class Profiler:
+    """Collects a deterministic and a sampling profile at the same time."""
+
+    def __init__(self, interval: float = DEFAULT_SAMPLING_INTERVAL) -> None:
+        assert interval > 0
+        self.interval = interval
+        self.deterministic = cProfile.Profile()
+        # Number of samples of each collapsed stack.
+        self.samples: "Counter[str]" = Counter()
+        # Phases entered in each thread and frames which entered them.
+        self.phases: Dict[int, List[Tuple[str, FrameType]]] = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(
+            target=self._sample_until_stopped, daemon=True
+        )
+
+    def start(self) -> None:
+        """Start collecting both profiles."""
+        global _active_profiler
+        assert _active_profiler is None, "Another profile is being collected"
+        _active_profiler = self
+        self._sampler.start()
+        self.deterministic.enable()
+
+    def stop(self) -> None:
+        """Stop collecting both profiles."""
+        global _active_profiler
+        self.deterministic.disable()
+        self._stop.set()
+        self._sampler.join()
+        _active_profiler = None
+
+    def write(self, prefix: str) -> None:
+        """Write `PREFIX.pstats` and `PREFIX.folded` files."""
+        self.deterministic.dump_stats(prefix + ".pstats")
+        with open(prefix + ".folded", "w") as folded_file:
+            for stack, count in sorted(self.samples.items()):
+                folded_file.write(f"{stack} {count}\n")
+
+    def _sample_until_stopped(self) -> None:
+        sampler_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != sampler_id:
+                    self.samples[self._collapse(thread_id, frame)] += 1
+
+    def _collapse(self, thread_id: int, frame: FrameType) -> str:
+        """Return the stack of a thread as a single line, from its root."""
+        phases_by_frame: Dict[int, List[str]] = {}
+        # The list may be appended to by its thread while it's copied here.
+        for name, phase_frame in list(self.phases.get(thread_id, ())):
+            phases_by_frame.setdefault(id(phase_frame), []).append(name)
+        stack = []
+        current: Optional[FrameType] = frame
+        while current is not None:
+            for name in reversed(phases_by_frame.get(id(current), [])):
+                stack.append(f"[{name}]")
+            code = current.f_code
+            stack.append(
+                f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+            )
+            current = current.f_back
+        return ";".join(reversed(stack))
+
+
+class _Phase:
+    """Context manager which marks a phase while profiling."""
+
+    def __init__(self, profiler: Profiler, name: str, frame: FrameType) -> None:
+        self.phases = profiler.phases.setdefault(threading.get_ident(), [])
+        self.entry = (name, frame)
+
+    def __enter__(self) -> None:
+        self.phases.append(self.entry)
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        popped = self.phases.pop()
+        assert popped is self.entry
+
+
+_active_profiler: Optional[Profiler] = None
+
+
+def phase(name: str) -> ContextManager[None]:
+    """Mark the code run within the returned context as a phase of solving.
+
+    This is cheap when no profile is being collected.
+    """
+    profiler = _active_profiler
+    if profiler is None:
+        return _NO_PHASE
+    return _Phase(profiler, name, sys._getframe(1))
+
+
+def iter_phase(name: str, items: Iterable[_Item]) -> Iterator[_Item]:
+    """Generate items, marking the work of getting each one as a phase.
+
+    Items are yielded outside of the phase, since the code which consumes
+    them runs in between.
+    """
+    iterator = iter(items)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+@contextmanager
+def profile(
+    prefix: str, interval: float = DEFAULT_SAMPLING_INTERVAL
+) -> Iterator[Profiler]:
+    """Profile the code run within the context.
+
+    Profiles are written to `PREFIX.pstats` and `PREFIX.folded` at the end,
+    also if the code raises an exception.
+    """
+    profiler = Profiler(interval)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.write(prefix)
@@ -0,0 +1,129 @@
+"""Tests for external.py."""
+
+import os
+import random
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import pytest
+
+from cut_optimizer.algorithms.differential import (
+    check_solution,
+    random_instance,
+    x_travel,
+)
+from cut_optimizer.algorithms.optimize_x_moves import (
+    solve_with_graph,
+    XCoordGraph,
+)
+from cut_optimizer.external import (
+    ExternalSorter,
+    ExternalXCoordGraph,
+    optimize_x_moves_external,
+    SpilledPolylines,
+)
+from cut_optimizer.instance import (
+    format_polyline,
+    InstanceFormatError,
+    Point,
+    Polyline,
+)
+
+
+def test_sorter_merges_runs_stably(tmp_path: Path) -> None:
+    """Test merging sorted runs with records of equal keys."""
+    sorter = ExternalSorter(str(tmp_path), max_records=3)
+    for index, key in enumerate([5, 1, 5, 3, 1, 5, 2]):
+        sorter.add((key,), f"r{index}")
+    assert len(sorter.runs) == 2
+    assert list(sorter.merged()) == [
+        ((1,), "r1"),
+        ((1,), "r4"),
+        ((2,), "r6"),
+        ((3,), "r3"),
+        ((5,), "r0"),
+        ((5,), "r2"),
+        ((5,), "r5"),
+    ]
+
+
+def test_spilled_polylines(tmp_path: Path) -> None:
+    """Test reading polylines back from a file."""
+    polylines = [
+        Polyline("A", Point(1, 2), Point(3, 4), False),
+        Polyline("B", Point(1, 1), Point(5, 2), True),
+    ]
+    path = os.path.join(str(tmp_path), "polylines")
+    with open(path, "wb") as polyline_file:
+        polyline_file.write(b"X O 0 0 0 0\n")
+        for polyline in polylines:
+            polyline_file.write(format_polyline(polyline).encode() + b"\n")
+    spilled = SpilledPolylines(path, len(b"X O 0 0 0 0\n"), 2)
+    assert len(spilled) == 2
+    assert list(spilled) == polylines
+    assert spilled[-1] == polylines[-1]
+
+
+def test_same_travel_as_in_memory(tmp_path: Path) -> None:
+    """Test that spilling polylines doesn't change X travel."""
+    rng = random.Random(0)
+    for size in [0, 1, 5, 40, 120]:
+        polylines = random_instance(rng, size, max_x=30)
+        # Duplicates make bundles of both parities.
+        polylines += polylines[: size // 3]
+        steps = list(
+            optimize_x_moves_external(
+                iter(polylines), max_records=7, tmp_dir=str(tmp_path)
+            )
+        )
+        check_solution(polylines, steps)
+        assert x_travel(steps) == x_travel(solve_with_graph(polylines))
+    assert not os.listdir(str(tmp_path))
+
+
+def test_graph_is_built_before_steps(tmp_path: Path) -> None:
+    """Test that input errors are raised before any step is generated."""
+
+    def polylines() -> Iterator[Polyline]:
+        yield Polyline("A", Point(1, 0), Point(5, 0), False)
+        raise InstanceFormatError("Invalid polyline")
+
+    with pytest.raises(InstanceFormatError):
+        optimize_x_moves_external(
+            polylines(), max_records=1, tmp_dir=str(tmp_path)
+        )
+    assert not os.listdir(str(tmp_path))
+
+
+def test_closed_polylines_between_are_spilled(tmp_path: Path) -> None:
+    """Test placing closed polylines between X coordinates from disk."""
+    rng = random.Random(0)
+    open_polyline = Polyline("A", Point(0, 0), Point(100, 0), False)
+    closed = []
+    for index in range(50):
+        start_x = rng.randint(1, 99)
+        end_x = rng.randint(start_x, 99)
+        closed.append(
+            Polyline(f"C{index}", Point(start_x, 0), Point(end_x, 5), True)
+        )
+    in_memory = XCoordGraph()
+    in_memory.add_open_polylines([open_polyline])
+    in_memory.add_closed_polylines(closed)
+    graph = ExternalXCoordGraph(str(tmp_path), max_records=6)
+    graph.add_sorted_open_polylines(
+        [((0, 100), format_polyline(open_polyline))]
+    )
+    graph.add_closed_polylines(closed)
+    graph.index_closed_polylines()
+    assert len([name for name in os.listdir(tmp_path) if ".run" in name]) > 2
+
+    def positions(graph: XCoordGraph) -> Dict[int, List[str]]:
+        return {
+            graph.get_tag(vertex): [
+                polyline.name for polyline in graph.closed_polylines_at(vertex)
+            ]
+            for vertex in graph.vertices
+            if graph.closed_polylines_at(vertex)
+        }
+
+    assert positions(graph) == positions(in_memory)
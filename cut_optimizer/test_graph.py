@@ -0,0 +1,108 @@
+"""Tests for graph.py"""
+
+import pytest
+
+from cut_optimizer.graph import Edge, Graph, GraphView, Vertex
+
+
+def test_transaction_rolls_back_mutations() -> None:
+    # pylint: disable=invalid-name
+    """Test that mutations done in a transaction are undone afterwards."""
+    graph = Graph()
+    v1 = graph.add_vertex(Vertex())
+    v2 = graph.add_vertex(Vertex())
+    e1 = graph.add_edge(Edge(v1, v2))
+    with graph.transaction():
+        v3 = graph.add_vertex(Vertex())
+        graph.add_edge(Edge(v2, v3))
+        graph.add_edge(Edge(v3, v3))
+        graph.remove_edge(e1)
+        assert graph.get_vertex_degree(v1) == 0
+        assert graph.get_vertex_degree(v3) == 3
+    assert set(graph.vertices) == {v1, v2}
+    assert graph.edges == {e1}
+    assert graph.get_vertex_degree(v1) == 1
+    assert graph.get_vertex_degree(v2) == 1
+
+
+def test_nested_transactions() -> None:
+    # pylint: disable=invalid-name
+    """Test that inner transactions roll back only their own mutations."""
+    graph = Graph()
+    v1 = graph.add_vertex(Vertex())
+    with graph.transaction():
+        e1 = graph.add_edge(Edge(v1, v1))
+        with graph.transaction():
+            graph.add_edge(Edge(v1, v1))
+            assert len(graph.edges) == 2
+        assert graph.edges == {e1}
+    assert not graph.edges
+
+
+def test_nested_transactions_without_outer_mutations() -> None:
+    # pylint: disable=invalid-name
+    """Test that an inner transaction started first keeps logging."""
+    graph = Graph()
+    v1 = graph.add_vertex(Vertex())
+    with graph.transaction():
+        with graph.transaction():
+            graph.add_edge(Edge(v1, v1))
+        graph.add_edge(Edge(v1, v1))
+        assert len(graph.edges) == 1
+    assert not graph.edges
+
+
+def test_transaction_rolls_back_on_exception() -> None:
+    # pylint: disable=invalid-name
+    """Test that leaving a transaction with an exception rolls it back."""
+    graph = Graph()
+    v1 = graph.add_vertex(Vertex())
+    with pytest.raises(RuntimeError):
+        with graph.transaction():
+            graph.add_edge(Edge(v1, v1))
+            raise RuntimeError()
+    assert not graph.edges
+    assert graph.get_vertex_degree(v1) == 0
+
+
+def test_graph_view_does_not_modify_base() -> None:
+    # pylint: disable=invalid-name
+    """Test that modifying a view leaves the base graph intact."""
+    graph = Graph()
+    v1 = graph.add_vertex(Vertex())
+    v2 = graph.add_vertex(Vertex())
+    e1 = graph.add_edge(Edge(v1, v2))
+    e2 = graph.add_edge(Edge(v2, v2))
+
+    view = GraphView(graph)
+    assert set(view.vertices) == {v1, v2}
+    assert set(view.edges) == {e1, e2}
+    view.remove_edge(e2)
+    v3 = view.add_vertex(Vertex())
+    e3 = view.add_edge(Edge(v2, v3))
+    assert set(view.vertices) == {v1, v2, v3}
+    assert set(view.edges) == {e1, e3}
+    assert len(view.edges) == 2
+    assert view.get_vertex_degree(v2) == 2
+    assert view.get_vertex_degree(v3) == 1
+
+    assert set(graph.vertices) == {v1, v2}
+    assert graph.edges == {e1, e2}
+    assert graph.get_vertex_degree(v2) == 3
+
+
+def test_graph_view_transaction() -> None:
+    # pylint: disable=invalid-name
+    """Test that transactions work on views."""
+    graph = Graph()
+    v1 = graph.add_vertex(Vertex())
+    e1 = graph.add_edge(Edge(v1, v1))
+    view = GraphView(graph)
+    with view.transaction():
+        view.remove_edge(e1)
+        v2 = view.add_vertex(Vertex())
+        view.add_edge(Edge(v1, v2))
+        assert len(list(view.vertices)) == 2
+    assert list(view.vertices) == [v1]
+    assert set(view.edges) == {e1}
+    assert view.get_vertex_degree(v1) == 2
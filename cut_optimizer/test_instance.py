@@ -0,0 +1,49 @@
+"""Tests for instance.py."""
+
+import io
+
+import pytest
+
+from cut_optimizer.instance import (
+    format_polyline,
+    InstanceFormatError,
+    parse_polyline,
+    Point,
+    Polyline,
+    read_instance,
+)
+
+
+def test_parse_polyline() -> None:
+    """Test parsing valid lines."""
+    polyline = Polyline("A", Point(1, 2), Point(3, 4), True)
+    assert parse_polyline(format_polyline(polyline) + "\n") == polyline
+    assert parse_polyline("# comment") is None
+    assert parse_polyline("") is None
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "A O 1 2 3",
+        "A X 1 2 3 4",
+        "A O 1 2 3 four",
+        "A C 3 2 1 4",
+        "A O 1 2 3 99999999999999999999",
+        "A O -1 2 3 4",
+        "A C 1 -2 3 4",
+    ],
+)
+def test_parse_invalid_polyline(line: str) -> None:
+    """Test rejecting invalid lines."""
+    with pytest.raises(InstanceFormatError):
+        parse_polyline(line)
+
+
+def test_errors_have_line_numbers() -> None:
+    """Test reporting where an invalid line is."""
+    input_file = io.StringIO("# comment\nA O 1 2 3 4\nB O 1 2 3\n")
+    with pytest.raises(InstanceFormatError) as error:
+        read_instance(input_file)
+    assert error.value.line_number == 3
+    assert str(error.value) == "line 3: expected 6 fields, got 5"
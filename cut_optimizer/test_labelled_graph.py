@@ -99,3 +99,24 @@ def test_repeated_tags() -> None:
     e3 = graph.add_tagged_edge(v1, v2, "edge")
     assert graph.get_tag(e3) == "edge"
     assert graph.get_edge("edge") == e3
+
+
+def test_transaction_restores_tags() -> None:
+    # pylint: disable=invalid-name
+    """Test that rolling back a transaction restores tags."""
+    graph = LabelledGraph[int, str]()
+    v1 = graph.add_tagged_vertex(1)
+    e1 = graph.add_tagged_edge(v1, v1, "e1")
+    with graph.transaction():
+        graph.add_tagged_vertex(2)
+        graph.add_tagged_edge(1, 2, "e2")
+        graph.add_tagged_edge(1, 2, "e1")
+        graph.remove_edge(e1)
+        assert graph.get_vertex(2)
+        assert graph.get_edge("e2")
+    assert list(graph.get_vertex_tags()) == [1]
+    assert list(graph.get_edge_tags()) == ["e1"]
+    assert graph.get_edge("e1") == e1
+    assert graph.get_tag(e1) == "e1"
+    with pytest.raises(KeyError):
+        graph.get_vertex(2)
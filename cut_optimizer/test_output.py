@@ -0,0 +1,60 @@
+"""Tests for output.py"""
+
+import io
+
+import pytest
+
+from cut_optimizer.algorithms.optimize_x_moves import SolutionStep
+from cut_optimizer.instance import Point, Polyline
+from cut_optimizer.output import GCodeTemplates, write_gcode, write_text
+
+_OPEN = Polyline("A", Point(1, 2), Point(3, 4), is_closed=False)
+_CLOSED = Polyline("B", Point(5, 6), Point(7, 8), is_closed=True)
+_STEPS = [
+    SolutionStep(_OPEN, Point(3, 4), Point(1, 2)),
+    SolutionStep(_CLOSED, Point(6, 6), Point(6, 6)),
+]
+
+
+def test_write_text() -> None:
+    """Test writing steps as text."""
+    output = io.StringIO()
+    write_text(_STEPS, output)
+    assert output.getvalue() == (
+        "A reverse (3, 4) -> (1, 2)\n" "B closed  (6, 6) -> (6, 6)\n"
+    )
+
+
+def test_write_gcode() -> None:
+    """Test writing steps as G-code with custom templates."""
+    templates = GCodeTemplates.from_overrides(
+        {
+            "header": "",
+            "rapid": "G0 X{start_x} Y{start_y}",
+            "cut_start": "(cut {name} {direction})",
+            "closed_start": "(contour {name})",
+            "cut_end": "G1 X{end_x} Y{end_y}",
+        }
+    )
+    output = io.StringIO()
+    write_gcode(iter(_STEPS), output, templates)
+    assert output.getvalue().splitlines() == [
+        "G0 X3 Y4",
+        "(cut A reverse)",
+        "G1 X1 Y2",
+        "G0 X6 Y6",
+        "(contour B)",
+        "G1 X6 Y6",
+        "M2",
+    ]
+
+
+def test_invalid_gcode_templates() -> None:
+    """Test that invalid template overrides are rejected."""
+    with pytest.raises(ValueError):
+        GCodeTemplates.from_overrides({"no_such_template": ""})
+    with pytest.raises(ValueError):
+        GCodeTemplates.from_overrides({"rapid": "G0 Z{z}"})
+    for template in ["G0 X{start_x", "G0 {name.x}", "G0 X{name:d}", "{0}"]:
+        with pytest.raises(ValueError):
+            GCodeTemplates.from_overrides({"rapid": template})
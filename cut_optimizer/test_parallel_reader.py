@@ -0,0 +1,52 @@
+"""Tests for parallel_reader.py."""
+
+import random
+from pathlib import Path
+
+import pytest
+
+from cut_optimizer.algorithms.differential import random_instance
+from cut_optimizer.instance import format_polyline, InstanceFormatError
+from cut_optimizer.parallel_reader import (
+    iter_instance_parallel,
+    read_instance_parallel,
+    split_into_chunks,
+)
+
+
+def test_split_into_chunks() -> None:
+    """Test splitting data at newlines."""
+    data = b"ab\ncd\n\nefgh\nij"
+    chunks = split_into_chunks(data, chunk_size=4)
+    assert chunks == [(0, 6), (6, 12), (12, 14)]
+    assert b"".join(data[start:end] for start, end in chunks) == data
+    assert split_into_chunks(b"", chunk_size=4) == []
+
+
+def test_same_as_sequential(tmp_path: Path) -> None:
+    """Test that parallel parsing gives the same polylines."""
+    polylines = random_instance(random.Random(0), 300)
+    path = tmp_path / "instance"
+    path.write_text(
+        "# comment\n"
+        + "".join(format_polyline(polyline) + "\n" for polyline in polylines)
+    )
+    for chunk_size in [1, 100, 10 ** 6]:
+        assert read_instance_parallel(str(path), 2, chunk_size) == polylines
+        assert (
+            list(iter_instance_parallel(str(path), 3, chunk_size)) == polylines
+        )
+    empty_path = tmp_path / "empty"
+    empty_path.write_text("")
+    assert read_instance_parallel(str(empty_path), 2) == []
+
+
+def test_errors_have_global_line_numbers(tmp_path: Path) -> None:
+    """Test counting lines from the beginning of the file."""
+    lines = [f"P{index} O 1 2 3 4\n" for index in range(100)]
+    lines[57] = "P57 O 1 2 3\n"
+    path = tmp_path / "instance"
+    path.write_text("".join(lines))
+    with pytest.raises(InstanceFormatError) as error:
+        read_instance_parallel(str(path), 2, chunk_size=50)
+    assert error.value.line_number == 58
@@ -0,0 +1,62 @@
+"""Tests for profiling.py."""
+
+import pstats
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+from cut_optimizer import profiling
+from cut_optimizer.profiling import iter_phase, phase, profile
+
+
+def _busy(seconds: float) -> None:
+    """Keep the CPU busy for some time."""
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time:
+        pass
+
+
+def test_phase_without_profile() -> None:
+    """Test that phases do nothing when no profile is being collected."""
+    with phase("idle"):
+        assert profiling._active_profiler is None
+
+
+def test_iter_phase(tmp_path: Path) -> None:
+    """Test that only getting items is marked as a phase."""
+    with profile(str(tmp_path / "profile")) as profiler:
+
+        def items() -> Iterator[int]:
+            for item in range(3):
+                phases = profiler.phases[threading.get_ident()]
+                assert [name for name, _frame in phases] == ["items"]
+                yield item
+
+        for item in iter_phase("items", items()):
+            assert not profiler.phases[threading.get_ident()]
+    assert item == 2
+
+
+def test_profile_writes_labelled_stacks(tmp_path: Path) -> None:
+    """Test that both profiles are written with stacks labelled by phases."""
+    prefix = str(tmp_path / "profile")
+    with profile(prefix, interval=0.001) as profiler:
+        with phase("outer"):
+            with phase("inner"):
+                _busy(0.2)
+    assert profiling._active_profiler is None
+    assert not any(profiler.phases.values())
+
+    functions = pstats.Stats(prefix + ".pstats").stats  # type: ignore
+    assert any(name == "_busy" for _file, _line, name in functions)
+
+    with open(prefix + ".folded") as folded_file:
+        lines = folded_file.read().splitlines()
+    labelled = [
+        line
+        for line in lines
+        if "[outer];[inner];_busy (" in line.rpartition(" ")[0]
+    ]
+    assert labelled
+    assert all(int(line.rpartition(" ")[2]) > 0 for line in lines)